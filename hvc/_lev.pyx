@@ -0,0 +1,114 @@
+# cython: language_level=3, boundscheck=False, wraparound=False
+"""
+compiled Levenshtein distance, used by hvc.metrics.lev_np
+when the optional extension is built (requires Cython, see setup.py)
+"""
+
+from libc.stdint cimport uint64_t
+from libc.stdlib cimport calloc, malloc, free
+
+
+def lev_codes(const Py_ssize_t[::1] source,
+              const Py_ssize_t[::1] target,
+              Py_ssize_t n_codes):
+    """Levenshtein distance between two sequences of integer codes
+
+    Parameters
+    ----------
+    source : 1-d numpy array of integer codes (dtype np.intp)
+    target : 1-d numpy array of integer codes (dtype np.intp)
+        len(source) >= len(target) > 0
+    n_codes : int
+        number of unique codes, i.e. all codes are in range(n_codes)
+
+    Returns
+    -------
+    Levenshtein distance : integer
+    """
+    cdef Py_ssize_t dist
+    # release the GIL so hvc.metrics.lev_np_batch can run pairs in threads
+    with nogil:
+        if target.shape[0] <= 64:
+            dist = _lev_myers(source, target, n_codes)
+        else:
+            dist = _lev_two_rows(source, target)
+    if dist < 0:
+        raise MemoryError()
+    return dist
+
+
+cdef Py_ssize_t _lev_myers(const Py_ssize_t[::1] source,
+                           const Py_ssize_t[::1] target,
+                           Py_ssize_t n_codes) noexcept nogil:
+    """Myers' bit-parallel algorithm, same as hvc.metrics._lev_myers
+    but with the column of the matrix in one 64-bit word.
+    Returns -1 if memory can't be allocated"""
+    cdef Py_ssize_t n_target = target.shape[0]
+    cdef Py_ssize_t dist = n_target
+    cdef Py_ssize_t ind
+    cdef uint64_t mask, last_bit, match, x_vert, x_horiz, pos_horiz, neg_horiz
+    cdef uint64_t pos_vert, neg_vert = 0
+
+    if n_target == 64:
+        mask = ~(<uint64_t>0)
+    else:
+        mask = ((<uint64_t>1) << n_target) - 1
+    last_bit = (<uint64_t>1) << (n_target - 1)
+    pos_vert = mask
+
+    cdef uint64_t *match_bits = <uint64_t *> calloc(n_codes, sizeof(uint64_t))
+    if match_bits == NULL:
+        return -1
+    for ind in range(n_target):
+        match_bits[target[ind]] |= (<uint64_t>1) << ind
+
+    for ind in range(source.shape[0]):
+        match = match_bits[source[ind]]
+        x_vert = match | neg_vert
+        x_horiz = (((match & pos_vert) + pos_vert) ^ pos_vert) | match
+        pos_horiz = neg_vert | ~(x_horiz | pos_vert)
+        neg_horiz = pos_vert & x_horiz
+        if pos_horiz & last_bit:
+            dist += 1
+        elif neg_horiz & last_bit:
+            dist -= 1
+        pos_horiz = ((pos_horiz << 1) | 1) & mask
+        neg_horiz = (neg_horiz << 1) & mask
+        pos_vert = (neg_horiz | ~(x_vert | pos_horiz)) & mask
+        neg_vert = pos_horiz & x_vert
+
+    free(match_bits)
+    return dist
+
+
+cdef Py_ssize_t _lev_two_rows(const Py_ssize_t[::1] source,
+                              const Py_ssize_t[::1] target) noexcept nogil:
+    """dynamic programming with two rows, same as hvc.metrics._lev_codes.
+    Returns -1 if memory can't be allocated"""
+    cdef Py_ssize_t n_target = target.shape[0]
+    cdef Py_ssize_t i, j, dist, s
+    cdef Py_ssize_t *prev_row
+    cdef Py_ssize_t *curr_row
+    cdef Py_ssize_t *rows = <Py_ssize_t *> malloc(2 * (n_target + 1) * sizeof(Py_ssize_t))
+    if rows == NULL:
+        return -1
+    prev_row = rows
+    curr_row = rows + n_target + 1
+
+    for j in range(n_target + 1):
+        prev_row[j] = j
+    for i in range(source.shape[0]):
+        curr_row[0] = i + 1
+        s = source[i]
+        for j in range(n_target):
+            dist = prev_row[j] + (s != target[j])  # substitution
+            if prev_row[j + 1] + 1 < dist:  # insertion
+                dist = prev_row[j + 1] + 1
+            if curr_row[j] + 1 < dist:  # deletion
+                dist = curr_row[j] + 1
+            curr_row[j + 1] = dist
+        prev_row, curr_row = curr_row, prev_row
+
+    dist = prev_row[n_target]
+    free(rows)
+    return dist
@@ -1,9 +1,12 @@
+import threading
 import warnings
 
 import numpy as np
 from scipy.io import wavfile
+import scipy.fft
 import scipy.signal
-from matplotlib.mlab import specgram
+from scipy.signal.windows import dpss
+from numpy.lib.stride_tricks import sliding_window_view
 
 from . import evfuncs, koumura
 
@@ -69,6 +72,121 @@ def butter_bandpass_filter(data, samp_freq, freq_cutoffs, order=8):
     return scipy.signal.lfilter(b, a, data)
 
 
+# windows are keyed by (kind, nperseg) so each one is only computed once,
+# since computing a dpss window requires solving an eigenvalue problem
+_WINDOW_CACHE = {}
+
+
+def _get_window(kind, nperseg, dtype='float64'):
+    """returns window of type kind with width nperseg, computing it only
+    the first time it is requested.
+
+    Parameters
+    ----------
+    kind : str
+        {'Hann', 'dpss', 'tukey'}
+    nperseg : int
+        number of samples in window
+    dtype : str
+        name of numpy dtype, to match segments. Default is 'float64'.
+
+    Returns
+    -------
+    window : ndarray
+        Read-only, because the same array is shared by all Spectrogram objects
+    """
+
+    key = (kind, nperseg, dtype)
+    window = _WINDOW_CACHE.get(key)
+    if window is None:
+        if dtype != 'float64':
+            # cast from the float64 window, so it is only computed once
+            window = _get_window(kind, nperseg).astype(dtype)
+        elif kind == 'Hann':
+            window = np.hanning(nperseg)
+        elif kind == 'dpss':
+            # equivalent to slepian with width parameter 4 / nperseg,
+            # since NW = width * nperseg / 2
+            window = dpss(nperseg, 2)
+        elif kind == 'tukey':
+            # default window for scipy.signal.spectrogram
+            window = scipy.signal.get_window(('tukey', .25), nperseg)
+        else:
+            raise ValueError('{} is not a valid specification for window'.
+                             format(kind))
+        window.flags.writeable = False
+        _WINDOW_CACHE[key] = window
+    return window
+
+
+def _rfft(segments):
+    """rfft of every row in segments, using all CPU cores"""
+
+    return scipy.fft.rfft(segments, axis=-1, workers=-1)
+
+
+# spectrogram parameters from references, used when Spectrogram is
+# initialized with the 'ref' argument. See Spectrogram.__init__ docstring.
+_REF_PARAMS = {
+    'tachibana': {
+        'nperseg': 256,
+        'noverlap': 192,
+        'window': 'Hann',
+        'freq_cutoffs': [10, 15990],  # basically no bandpass, as in Tachibana
+        'filter_func': 'diff',
+        'spect_func': 'mpl',
+        'log_transform_spect': False,  # see tachibana feature docs
+        'thresh': None,
+    },
+    'koumura': {
+        'nperseg': 512,
+        'noverlap': 480,
+        'window': 'dpss',
+        'freq_cutoffs': [1000, 8000],
+        'filter_func': None,
+        'spect_func': 'scipy',
+        'log_transform_spect': True,
+        'thresh': None,
+    },
+}
+
+# lowest thresh (in log10 units) for which Spectrogram computes log-transformed
+# PSDs in single precision. Above it, values differ from double precision by
+# less than 0.003 (i.e. 0.7% of power) for the test data; see Spectrogram.__init__
+_FLOAT32_MIN_THRESH = -4.0
+
+# largest scratch memory for segments that a Spectrogram keeps between calls,
+# in bytes. Bigger calls, e.g. a long recording, get memory that is freed
+# when the call returns. See Spectrogram._get_segments
+_SEGMENTS_BUF_MAX_BYTES = 2 ** 24
+
+# parameters that are over-written when Spectrogram is initialized with 'ref'
+_REF_OVERRIDDEN_PARAMS = ('nperseg',
+                          'noverlap',
+                          'freq_cutoffs',
+                          'filter_func',
+                          'spect_func')
+
+
+def _warn_if_ref_overrides(spect_params):
+    """warns if spect_params has 'ref' and also parameters that 'ref'
+    over-writes. Called by Spectrogram.__init__, and also by
+    Spectrogram.from_params every time, since it returns cached objects."""
+
+    if (spect_params.get('ref') is not None and
+            any(spect_params.get(param) is not None
+                for param in _REF_OVERRIDDEN_PARAMS)):
+        warnings.warn('Spectrogram class received ref '
+                      'parameter but also received other parameters, '
+                      'will over-write those with defaults for reference.')
+
+
+# Spectrogram objects returned by Spectrogram.from_ref, keyed by ref
+_REF_CACHE = {}
+# and by Spectrogram.from_params, keyed by repr of sorted parameters
+_PARAMS_CACHE = {}
+
+
 class Spectrogram:
     """class for making spectrograms.
     Abstracts out function calls so user just has to put spectrogram parameters
@@ -113,8 +231,8 @@ class Spectrogram:
             valid strings are 'Hann', 'dpss', None
             Hann -- Uses np.Hanning with parameter M (window width) set to value of nperseg
             dpss -- Discrete prolate spheroidal sequence AKA Slepian.
-                Uses scipy.signal.slepian with M parameter equal to nperseg and
-                width parameter equal to 4/nperseg, as in [2]_.
+                Uses scipy.signal.windows.dpss with M parameter equal to nperseg and
+                NW parameter equal to 2, i.e. a width of 4/nperseg as in [2]_.
             Default is None.
         filter_func : str
             filter to apply to raw audio. valid strings are 'diff' or None
@@ -124,8 +242,9 @@ class Spectrogram:
         spect_func : str
             which function to use for spectrogram.
             valid strings are 'scipy' or 'mpl'.
-            'scipy' uses scipy.signal.spectrogram,
-            'mpl' uses matplotlib.matlab.specgram.
+            'scipy' computes the same spectrogram as scipy.signal.spectrogram,
+            'mpl' computes the same spectrogram as matplotlib.mlab.specgram.
+            Both are computed with scipy.fft.rfft on all segments at once.
             Default is 'scipy'.
         log_transform_spect : bool
             if True, applies np.log10 to spectrogram to increase range.
@@ -135,6 +254,9 @@ class Spectrogram:
             All values below thresh are set to thresh;
             increases contrast when visualizing spectrogram with a colormap.
             Default is -4 (assumes log_transform_spect==True)
+            With log_transform_spect and spect_func 'scipy', a thresh of -4
+            or higher lets the spectrogram be computed in single precision,
+            which is faster; otherwise it is computed in double precision.
 
         References
         ----------
@@ -149,45 +271,28 @@ class Spectrogram:
 
         # check for 'reference' parameter first since it takes precedence
         if ref is not None:
-            if ref not in ('tachibana', 'koumura'):
-                raise ValueError('{} is not a valid value for reference argument'.
-                                 format(ref))
+            if ref not in _REF_PARAMS:
+                raise ValueError('{} is not a valid value for \'ref\' argument. '
+                                 'Valid values: {{\'tachibana\',\'koumura\',None}}'
+                                 .format(ref))
             # warn if called with 'ref' and with other params
-            if any(param is not None
-                   for param in [nperseg,
-                                 noverlap,
-                                 freq_cutoffs,
-                                 filter_func,
-                                 spect_func]):
-                warnings.warn('Spectrogram class received ref '
-                              'parameter but also received other parameters, '
-                              'will over-write those with defaults for reference.')
-            else:
-                if ref == 'tachibana':
-                    self.nperseg = 256
-                    self.noverlap = 192
-                    self.window = np.hanning(self.nperseg)  # Hann window
-                    self.freqCutoffs = [10, 15990]  # basically no bandpass, as in Tachibana
-                    self.filterFunc = 'diff'
-                    self.spectFunc = 'mpl'
-                    self.logTransformSpect = False  # see tachibana feature docs
-                    self.thresh = None
-                    self.ref = ref
-                elif ref == 'koumura':
-                    self.nperseg = 512
-                    self.noverlap = 480
-                    self.window = scipy.signal.slepian(self.nperseg,
-                                                       4 / self.nperseg)  #dpss
-                    self.freqCutoffs = [1000, 8000]
-                    self.filterFunc = None
-                    self.spectFunc = 'scipy'
-                    self.logTransformSpect = True
-                    self.thresh = None
-                    self.ref = ref
-                else:
-                    raise ValueError('{} is not a valid value for \'ref\' argument. '
-                                     'Valid values: {\'tachibana\',\'koumura\',None}'
-                                     .format(ref))
+            _warn_if_ref_overrides({'ref': ref,
+                                    'nperseg': nperseg,
+                                    'noverlap': noverlap,
+                                    'freq_cutoffs': freq_cutoffs,
+                                    'filter_func': filter_func,
+                                    'spect_func': spect_func})
+            ref_params = _REF_PARAMS[ref]
+            self.nperseg = ref_params['nperseg']
+            self.noverlap = ref_params['noverlap']
+            window = ref_params['window']
+            self.window = _get_window(window, self.nperseg)
+            self.freqCutoffs = list(ref_params['freq_cutoffs'])
+            self.filterFunc = ref_params['filter_func']
+            self.spectFunc = ref_params['spect_func']
+            self.logTransformSpect = ref_params['log_transform_spect']
+            self.thresh = ref_params['thresh']
+            self.ref = ref
 
         elif ref is None:
             if nperseg is None:
@@ -219,12 +324,10 @@ class Spectrogram:
                     raise ValueError('{} is not a valid specification for window'.
                                      format(window))
                 else:
-                    if window == 'Hann':
-                        self.window = np.hanning(self.nperseg)
-                    elif window == 'dpss':
-                        self.window = slepian(self.nperseg, 4 / self.nperseg)
-                    elif window is None:
+                    if window is None:
                         self.window = None
+                    else:
+                        self.window = _get_window(window, self.nperseg)
 
             if freq_cutoffs is None:
                 # switch to default
@@ -238,7 +341,8 @@ class Spectrogram:
             elif not all([type(val) == int for val in freq_cutoffs]):
                 raise ValueError('all values in freq_cutoffs list must be ints')
             else:
-                self.freqCutoffs = freq_cutoffs
+                # copy, since from_params shares this object across callers
+                self.freqCutoffs = list(freq_cutoffs)
 
             if filter_func is not None and type(filter_func) != str:
                 raise TypeError('type of filter_func must be str, but is {}'.
@@ -274,6 +378,337 @@ class Spectrogram:
             else:
                 self.thresh = thresh
 
+        # Set up everything make needs that does not depend on the audio,
+        # so it is done once here instead of on every call.
+        # When no window is specified, the window applied to segments is the
+        # default of the function whose spectrogram is reproduced
+        if window is None:
+            if self.spectFunc == 'scipy':
+                window = 'tukey'
+            elif self.spectFunc == 'mpl':
+                window = 'Hann'
+        # Segments are float32 only for log-transformed PSDs that are
+        # thresholded at _FLOAT32_MIN_THRESH or higher. Below that, the rounding
+        # error of a single precision FFT is not clipped away by the threshold
+        # (and powers can underflow to zero, giving -inf after the log), so
+        # low-power bins would differ from float64 by up to ~1 decade.
+        # The 'mpl' complex spectrum and PSDs without the log stay float64,
+        # since e.g. tachibana features square the magnitude of the spectrum,
+        # which overflows single precision
+        if (self.spectFunc == 'scipy' and self.logTransformSpect and
+                self.thresh is not None and self.thresh >= _FLOAT32_MIN_THRESH):
+            self._dtype = 'float32'
+        else:
+            self._dtype = 'float64'
+        self._window_key = (window, self.nperseg, self._dtype)
+        self._window = _get_window(*self._window_key)
+        # used to scale spectrum ('scipy' density and 'mpl' complex, respectively)
+        self._window_sq_sum = (self._window * self._window).sum()
+        self._window_sum = self._window.sum()
+        # resolve which spectrum is computed once, instead of on every call
+        if self.spectFunc == 'scipy':
+            self._spectrum = self._psd
+        elif self.spectFunc == 'mpl':
+            self._spectrum = self._complex_spectrum
+        # same for whether filter_func applies the differential filter
+        self._diff = self.filterFunc == 'diff'
+        # scratch memory that segments are copied into, one buffer per
+        # thread so shared Spectrograms can be used by threads, see _get_segments
+        self._scratch = threading.local()
+        # bandpass filter coefficients, frequency bins and PSD scale only depend on
+        # the sampling frequency, so they are cached with it as the key
+        self._bandpass_coeffs = {}
+        self._freq_bins = {}
+        self._psd_scales = {}
+
+    def __getstate__(self):
+        # scratch memory doesn't need to be pickled, see _get_segments
+        state = self.__dict__.copy()
+        del state['_scratch']
+        return state
+
+    def __setstate__(self, state):
+        """called when a Spectrogram is unpickled, e.g. after being sent to a
+        worker process by multiprocessing. Puts the window that came with it
+        in that process' window cache, so other Spectrograms made there with
+        the same window re-use it instead of computing it again (for 'dpss',
+        that means solving an eigenvalue problem).
+        """
+        state['_scratch'] = threading.local()
+        self.__dict__.update(state)
+        window = state['_window']
+        window.flags.writeable = False
+        self._window = _WINDOW_CACHE.setdefault(self._window_key, window)
+        if self.window is not None:
+            # self.window is always float64, whatever the dtype of segments
+            self.window.flags.writeable = False
+            self.window = _WINDOW_CACHE.setdefault(
+                (self._window_key[0], self.nperseg, 'float64'), self.window)
+
+    @classmethod
+    def from_ref(cls, ref):
+        """returns Spectrogram with parameters from a reference.
+        The same object is returned every time for a given ref,
+        so parameters are only set up once.
+
+        Parameters
+        ----------
+        ref : str
+            {'tachibana','koumura'}. See Spectrogram.__init__.
+
+        Returns
+        -------
+        spect_maker : Spectrogram
+        """
+
+        spect_maker = _REF_CACHE.get(ref)
+        if spect_maker is None:
+            spect_maker = cls(ref=ref)
+            _REF_CACHE[ref] = spect_maker
+        return spect_maker
+
+    @classmethod
+    def from_params(cls, spect_params):
+        """returns Spectrogram made with spect_params.
+        Like from_ref, the same object is returned every time the same
+        parameters are used, so that e.g. Song.make_syl_spects doesn't
+        validate parameters and set up the window, filter, etc. again
+        for every song file. The only memory that object keeps between
+        calls is set up that doesn't change (window, filter coefficients,
+        frequency bins) and a small scratch buffer for each thread,
+        so it is safe to share.
+
+        Parameters
+        ----------
+        spect_params : dict
+            keys should be parameters for Spectrogram.__init__,
+            see the docstring for those keys.
+
+        Returns
+        -------
+        spect_maker : Spectrogram
+        """
+
+        key = repr(sorted(spect_params.items()))
+        spect_maker = _PARAMS_CACHE.get(key)
+        if spect_maker is None:
+            spect_maker = cls(**spect_params)
+            _PARAMS_CACHE[key] = spect_maker
+        else:
+            # __init__ already warned the first time
+            _warn_if_ref_overrides(spect_params)
+        return spect_maker
+
+    def _filter(self, raw_audio, samp_freq):
+        """applies filters to raw audio before making spectrogram.
+
+        Parameters
+        ----------
+        raw_audio : numpy array
+            1-d, or 2-d with one waveform per row (used by make_batch
+            when all waveforms are the same length)
+        samp_freq : integer scalar
+            sampling frequency in Hz
+
+        Returns
+        -------
+        raw_audio : numpy array
+            after bandpass filter (and zero padding, see below)
+        n_samples : int
+            number of samples that will be in segments. The differential
+            filter is not applied here; instead it is applied by
+            _fill_segments while copying samples into segments, so
+            n_samples is one less than the length of raw_audio when
+            filter_func is 'diff'.
+        diff : bool
+            if True, _fill_segments should apply the differential filter
+        """
+
+        #below, I set freq_bins to >= freq_cutoffs
+        #so that Koumura default of [1000,8000] returns 112 freq. bins
+        if self.freqCutoffs is not None:
+            # same as butter_bandpass_filter, but only designs filter
+            # the first time a sampling frequency is seen
+            bandpass_coeffs = self._bandpass_coeffs.get(samp_freq)
+            if bandpass_coeffs is None:
+                bandpass_coeffs = butter_bandpass(self.freqCutoffs, samp_freq)
+                self._bandpass_coeffs[samp_freq] = bandpass_coeffs
+            b, a = bandpass_coeffs
+            raw_audio = scipy.signal.lfilter(b, a, raw_audio)
+
+        # differential filter_func, as applied in Tachibana Okanoya 2014.
+        # Instead of making a differenced copy of the whole signal with np.diff,
+        # the difference is taken while copying samples into segments
+        diff = self._diff
+        if diff:
+            n_samples = raw_audio.shape[-1] - 1
+        else:
+            n_samples = raw_audio.shape[-1]
+
+        if n_samples < self.nperseg:
+            if self.spectFunc == 'scipy':
+                raise WindowError()
+            elif self.spectFunc == 'mpl':
+                # mlab.specgram zero pads signals shorter than one segment
+                if diff:
+                    raw_audio = np.diff(raw_audio)
+                    diff = False
+                raw_audio = np.concatenate(
+                    (raw_audio,
+                     np.zeros(raw_audio.shape[:-1] + (self.nperseg - n_samples,),
+                              dtype=raw_audio.dtype)),
+                    axis=-1)
+                n_samples = self.nperseg
+
+        return raw_audio, n_samples, diff
+
+    def _n_segments(self, n_samples):
+        """number of segments in a signal with n_samples samples"""
+        return (n_samples - self.nperseg) // (self.nperseg - self.noverlap) + 1
+
+    def _get_segments(self, n_segments):
+        """returns array with shape (n_segments, nperseg)
+        for _fill_segments to copy segments into.
+        Segments are only scratch memory (the spectrogram is always a new
+        array), so the same memory is re-used by every call to make and
+        make_batch from the same thread, and only re-allocated when more
+        segments are needed. Each thread gets its own memory, so threads
+        can share a Spectrogram, e.g. one returned by from_params.
+        Memory bigger than _SEGMENTS_BUF_MAX_BYTES is not kept, so a
+        Spectrogram doesn't hold on to memory sized for the longest file it
+        has ever seen.
+        """
+
+        nbytes = n_segments * self.nperseg * np.dtype(self._dtype).itemsize
+        if nbytes > _SEGMENTS_BUF_MAX_BYTES:
+            return np.empty((n_segments, self.nperseg), dtype=self._dtype)
+        segments_buf = getattr(self._scratch, 'segments_buf', None)
+        if segments_buf is None or segments_buf.shape[0] < n_segments:
+            segments_buf = np.empty((n_segments, self.nperseg),
+                                    dtype=self._dtype)
+            self._scratch.segments_buf = segments_buf
+        return segments_buf[:n_segments]
+
+    def _fill_segments(self, raw_audio, diff, segments):
+        """copies overlapping segments of raw_audio into segments,
+        an array with shape (n_segments, nperseg).
+        For log-transformed PSDs segments is float32, which halves the memory
+        traffic of the FFT. Segments is then detrended + windowed in place,
+        so it is the only allocation made before calling rfft.
+        """
+
+        hop = self.nperseg - self.noverlap
+        if diff:
+            frames = sliding_window_view(raw_audio, self.nperseg + 1)[::hop]
+            np.subtract(frames[:, 1:], frames[:, :-1], out=segments)
+        else:
+            segments[:] = sliding_window_view(raw_audio, self.nperseg)[::hop]
+
+    def _get_freq_bins(self, samp_freq):
+        """frequency bins for sampling frequency samp_freq,
+        computed only the first time samp_freq is seen.
+        Read-only since the same array is returned for every spectrogram.
+        """
+
+        freq_bins = self._freq_bins.get(samp_freq)
+        if freq_bins is None:
+            freq_bins = scipy.fft.rfftfreq(self.nperseg, 1 / samp_freq)
+            freq_bins.flags.writeable = False
+            self._freq_bins[samp_freq] = freq_bins
+        return freq_bins
+
+    def _time_bins(self, n_samples, samp_freq):
+        """times of the center of each segment, in seconds"""
+        return np.arange(self.nperseg / 2,
+                         n_samples - self.nperseg / 2 + 1,
+                         self.nperseg - self.noverlap) / samp_freq
+
+    def _psd(self, segments, samp_freq, window):
+        """power spectral density of every row in segments,
+        same result as scipy.signal.spectrogram with default
+        detrend='constant', scaling='density', mode='psd'.
+        Used by _transform when spect_func is 'scipy'.
+        """
+
+        segments -= segments.mean(axis=-1, keepdims=True)
+        segments *= window
+        spect = _rfft(segments)
+        # |X|**2 with only one new array; imag part is squared in place
+        # since the complex FFT output isn't needed after this
+        spect_imag = spect.imag
+        spect = np.square(spect.real)
+        spect += np.square(spect_imag, out=spect_imag)
+        # scale for density and one-sided spectrum in one pass
+        spect *= self._get_psd_scale(samp_freq)
+        return spect
+
+    def _get_psd_scale(self, samp_freq):
+        """factor that each row of |rfft|**2 is multiplied by in _psd,
+        computed only the first time samp_freq is seen.
+        """
+
+        psd_scale = self._psd_scales.get(samp_freq)
+        if psd_scale is None:
+            psd_scale = np.full(self.nperseg // 2 + 1,
+                                1.0 / (samp_freq * self._window_sq_sum),
+                                dtype=self._dtype)
+            # one-sided density, so double everything except DC (and Nyquist)
+            if self.nperseg % 2:
+                psd_scale[1:] *= 2
+            else:
+                psd_scale[1:-1] *= 2
+            psd_scale.flags.writeable = False
+            self._psd_scales[samp_freq] = psd_scale
+        return psd_scale
+
+    def _complex_spectrum(self, segments, samp_freq, window):
+        """complex frequency spectrum of every row in segments,
+        same result as matplotlib.mlab.specgram(mode='complex').
+        Used by _transform when spect_func is 'mpl'.
+        """
+
+        # note that the matlab specgram function returns the STFT by default
+        # whereas the default for the matplotlib.mlab version of specgram
+        # returns the PSD. So to get the behavior of matplotlib.mlab.specgram
+        # to match, mode must be set to 'complex'
+
+        # I think I determined empirically at one point (by staring at single
+        # cases) that mlab.specgram gave me values that were closer to Matlab's
+        # specgram function than scipy.signal.spectrogram
+        # Matlab's specgram is what Tachibana used in his original feature
+        # extraction code. So I'm maintaining the option to use it here.
+
+        # 'mpl' is set to return complex frequency spectrum,
+        # not power spectral density,
+        # because some tachibana features (based on CUIDADO feature set)
+        # need to use the freq. spectrum before taking np.abs or np.log10
+        segments *= window
+        spect = _rfft(segments)
+        spect /= self._window_sum
+        return spect
+
+    def _transform(self, segments, samp_freq):
+        """computes spectrum of every row in segments.
+        Overwrites segments.
+
+        Returns
+        -------
+        spect : 2-d numpy array
+            with dimensions (time, frequency), i.e. one row per segment
+        """
+
+        spect = self._spectrum(segments, samp_freq, self._window)
+
+        if self.logTransformSpect:
+            spect = np.log10(spect, out=spect)  # log transform to increase range
+
+        if self.thresh is not None:
+            # same as spect[spect < self.thresh] = self.thresh,
+            # but in one pass without making a boolean mask
+            np.maximum(spect, self.thresh, out=spect)
+
+        return spect
+
     def make(self,
              raw_audio,
              samp_freq):
@@ -289,76 +724,93 @@ class Spectrogram:
         Returns
         -------
         spect : 2-d numpy array
+            with dimensions (frequency, time). Rows are in the same order
+            as freq_bins, i.e. lowest frequency first; spect is never flipped.
+            Note spect is a transposed view of the FFT output, so it is not
+            C-contiguous. Call np.ascontiguousarray on it if that's needed.
         freq_bins : 1-d numpy array
         time_bins : 1-d numpy array
         """
 
-        #below, I set freq_bins to >= freq_cutoffs
-        #so that Koumura default of [1000,8000] returns 112 freq. bins
-        if self.freqCutoffs is not None:
-            raw_audio = butter_bandpass_filter(raw_audio,
-                                               samp_freq,
-                                               self.freqCutoffs)
-
-        if self.filterFunc == 'diff':
-            raw_audio = np.diff(raw_audio)  # differential filter_func, as applied in Tachibana Okanoya 2014
+        raw_audio, n_samples, diff = self._filter(raw_audio, samp_freq)
+        segments = self._get_segments(self._n_segments(n_samples))
+        self._fill_segments(raw_audio, diff, segments)
+        # rfft is computed along last axis, so transpose to (freq, time)
+        spect = self._transform(segments, samp_freq).T
+        freq_bins = self._get_freq_bins(samp_freq)
+        time_bins = self._time_bins(n_samples, samp_freq)
+        return spect, freq_bins, time_bins
 
-        try:  # try to make spectrogram
-            if self.spectFunc == 'scipy':
-                if self.window is not None:
-                        freq_bins, time_bins, spect = scipy.signal.spectrogram(raw_audio,
-                                                                               samp_freq,
-                                                                               window=self.window,
-                                                                               nperseg=self.nperseg,
-                                                                               noverlap=self.noverlap)
-                else:
-                    freq_bins, time_bins, spect = scipy.signal.spectrogram(raw_audio,
-                                                                           samp_freq,
-                                                                           nperseg=self.nperseg,
-                                                                           noverlap=self.noverlap)
+    def make_batch(self,
+                   raw_audios,
+                   samp_freq):
+        """makes spectrograms from a list of raw audio waveforms,
+        e.g. all the syllables from one song.
+        Segments from all the waveforms are put into one array so that
+        the FFT, log transform, etc., are each run only once.
+        Gives the same spectrograms as calling make on each waveform.
 
-            elif self.spectFunc == 'mpl':
-                # note that the matlab specgram function returns the STFT by default
-                # whereas the default for the matplotlib.mlab version of specgram
-                # returns the PSD. So to get the behavior of matplotlib.mlab.specgram
-                # to match, mode must be set to 'complex'
-
-                # I think I determined empirically at one point (by staring at single
-                # cases) that mlab.specgram gave me values that were closer to Matlab's
-                # specgram function than scipy.signal.spectrogram
-                # Matlab's specgram is what Tachibana used in his original feature
-                # extraction code. So I'm maintaining the option to use it here.
-
-                # 'mpl' is set to return complex frequency spectrum,
-                # not power spectral density,
-                # because some tachibana features (based on CUIDADO feature set)
-                # need to use the freq. spectrum before taking np.abs or np.log10
-                if self.window is not None:
-                    spect, freq_bins, time_bins = specgram(raw_audio,
-                                                           NFFT=self.nperseg,
-                                                           Fs=samp_freq,
-                                                           window=self.window,
-                                                           noverlap=self.noverlap,
-                                                           mode='complex')
-                else:
-                    spect, freq_bins, time_bins = specgram(raw_audio,
-                                                           NFFT=self.nperseg,
-                                                           Fs=samp_freq,
-                                                           noverlap=self.noverlap,
-                                                           mode='complex')
-        except ValueError as err:  # if `try` to make spectrogram raised error
-            if str(err) == 'window is longer than input signal':
-                raise WindowError()
-            else:  # unrecognized error
-                raise
-
-        if self.logTransformSpect:
-            spect = np.log10(spect)  # log transform to increase range
+        Parameters
+        ----------
+        raw_audios : list of 1-d numpy arrays
+            raw audio waveforms
+        samp_freq : integer scalar
+            sampling frequency in Hz, same for all waveforms
 
-        if self.thresh is not None:
-            spect[spect < self.thresh] = self.thresh
+        Returns
+        -------
+        spects : list of 2-d numpy arrays
+            spectrogram for each waveform, as returned by make.
+            Each one is copied out of the batch, so keeping one spectrogram
+            doesn't keep the spectrograms of the whole batch in memory.
+            None for any waveform that is not long enough for the
+            window, i.e. where make would raise a WindowError.
+        freq_bins : 1-d numpy array
+            same for all spectrograms
+        time_bins : list of 1-d numpy arrays
+            time bins for each spectrogram, None where spects is None
+        """
 
-        return spect, freq_bins, time_bins
+        if (len(raw_audios) > 1 and
+                len({raw_audio.shape[-1] for raw_audio in raw_audios}) == 1):
+            # all the same length, e.g. syllables when syl_spect_width is set,
+            # so stack them and filter all at once
+            try:
+                raw_audio, n_samples, diff = self._filter(np.stack(raw_audios),
+                                                          samp_freq)
+                filtered = [(row, n_samples, diff) for row in raw_audio]
+            except WindowError:
+                filtered = [None] * len(raw_audios)
+        else:
+            filtered = []
+            for raw_audio in raw_audios:
+                try:
+                    filtered.append(self._filter(raw_audio, samp_freq))
+                except WindowError:
+                    filtered.append(None)
+
+        n_segments = [0 if filt is None else self._n_segments(filt[1])
+                      for filt in filtered]
+        bounds = np.cumsum([0] + n_segments)
+        segments = self._get_segments(bounds[-1])
+        for filt, start, stop in zip(filtered, bounds[:-1], bounds[1:]):
+            if filt is not None:
+                raw_audio, _, diff = filt
+                self._fill_segments(raw_audio, diff, segments[start:stop])
+        spect = self._transform(segments, samp_freq)
+
+        spects = []
+        time_bins = []
+        for filt, start, stop in zip(filtered, bounds[:-1], bounds[1:]):
+            if filt is None:
+                spects.append(None)
+                time_bins.append(None)
+            else:
+                # copy, so spects don't share (and keep alive) the batch
+                spects.append(spect[start:stop].copy().T)
+                time_bins.append(self._time_bins(filt[1], samp_freq))
+        freq_bins = self._get_freq_bins(samp_freq)
+        return spects, freq_bins, time_bins
 
 
 def compute_amp(spect):
@@ -367,12 +819,17 @@ def compute_amp(spect):
     Assumes the values for frequencies are power spectral density (PSD).
     Sums PSD for each time bin, i.e. in each column.
     Inputs:
-        spect -- output from spect_from_song
+        spect -- output from Spectrogram.make
     Returns:
-        amp -- amplitude
+        amp -- amplitude, same dtype as spect (float32 for log-transformed PSDs
+            from Spectrogram.make)
     """
 
-    return np.sum(spect,axis=0)
+    # spect from Spectrogram.make is a transposed view of an array where
+    # each time bin is a contiguous row, so summing over frequencies reads
+    # memory with unit stride. Calling the ufunc reduction directly skips
+    # the np.sum wrapper, and keeps the accumulator at the dtype of spect
+    return np.add.reduce(spect, axis=0)
 
 def segment_song(amp,
                  time_bins,
@@ -409,27 +866,57 @@ def segment_song(amp,
                           'min_syl_dur' : 0.2,
                           'min_silent_dur' : 0.02}
     above_th = amp > segment_params['threshold']
-    h = [1, -1] 
-    above_th_convoluted = np.convolve(h,above_th) # convolving with h causes:
+    # differencing above_th (padded with zeros on both ends) gives:
     # +1 whenever above_th changes from 0 to 1
-    onsets = time_bins[np.nonzero(above_th_convoluted > 0)]
     # and -1 whenever above_th changes from 1 to 0
-    offsets = time_bins[np.nonzero(above_th_convoluted < 0)]
-    
-    #get rid of silent intervals that are shorter than min_silent_dur
-    silent_gap_durs = onsets[1:] - offsets[:-1] # duration of silent gaps
-    keep_these = np.nonzero(silent_gap_durs > segment_params['min_silent_dur'])
-    onsets = onsets[keep_these]
-    offsets = offsets[keep_these]
-    
-    #eliminate syllables with duration shorter than min_syl_dur
-    syl_durs = offsets - onsets
-    keep_these = np.nonzero(syl_durs > segment_params['min_syl_dur'])
-    onsets = onsets[keep_these]
-    offsets = offsets[keep_these]
+    above_th_diff = np.diff(above_th.view(np.int8), prepend=0, append=0)
+    # because of the zero padding, changes alternate between +1 and -1,
+    # starting with +1, so a single pass finds both onsets and offsets
+    edge_times = time_bins[np.flatnonzero(above_th_diff)]
+    onsets = edge_times[0::2]
+    offsets = edge_times[1::2]
+
+    # get rid of silent intervals that are shorter than min_silent_dur
+    # and eliminate syllables with duration shorter than min_syl_dur.
+    # Both criteria go into one mask so onsets + offsets are only indexed once
+    silent_gap_durs = onsets[1:] - offsets[:-1]  # duration of silent gaps
+    syl_durs = offsets[:-1] - onsets[:-1]
+    keep_these = np.logical_and(
+        silent_gap_durs > segment_params['min_silent_dur'],
+        syl_durs > segment_params['min_syl_dur'])
+    onsets = onsets[:-1][keep_these]
+    offsets = offsets[:-1][keep_these]
 
     return onsets, offsets
 
+
+def _to_samples(times, samp_freq, units_per_s=1):
+    """converts times to the nearest sample numbers
+
+    Parameters
+    ----------
+    times : 1-d numpy array
+        e.g. onsets or offsets
+    samp_freq : int
+        sampling frequency in Hz
+    units_per_s : int
+        1 if times are in seconds, 1000 if times are in ms.
+        Default is 1.
+
+    Returns
+    -------
+    samples : 1-d numpy array of ints
+    """
+
+    # scale by samp_freq first so the product is exact for times that fall
+    # on sample boundaries, e.g. ms from .not.mat files, then np.rint and
+    # cast in place instead of np.round (which wraps rint) + another copy
+    samples = np.multiply(times, samp_freq, dtype=np.float64)
+    if units_per_s != 1:
+        samples /= units_per_s
+    return np.rint(samples, out=samples).astype(np.int64)
+
+
 class syllable:
     """
     syllable object, returned by make_syl_spect.
@@ -471,7 +958,8 @@ class syllable:
         self.spect = spect
         self.nfft = nfft
         self.overlap = overlap
-        self.freqCutoffs = freq_cutoffs
+        # copy, so changing it doesn't change the Spectrogram it came from
+        self.freqCutoffs = list(freq_cutoffs)
         self.freqBins = freq_bins
         self.timeBins = time_bins
         self.index = index
@@ -555,14 +1043,6 @@ class Song:
         self.filename = filename
         self.fileFormat = file_format
 
-        if file_format == 'evtaf':
-            raw_audio, samp_freq = evfuncs.load_cbin(filename)
-        elif file_format == 'koumura':
-            samp_freq, raw_audio = wavfile.read(filename)
-
-        self.rawAudio = raw_audio
-        self.sampFreq = samp_freq
-
         if use_annotation:
             if file_format == 'evtaf':
                 if segment_params is None:
@@ -595,8 +1075,8 @@ class Song:
                 self.onsets_s = song_dict['onsets'] / 1000
                 self.offsets_s = song_dict['offsets'] / 1000
                 # subtract one because of Python's zero indexing (first sample is sample zero)
-                self.onsets_Hz = np.round(self.onsets_s * self.sampFreq).astype(int) - 1
-                self.offsets_Hz = np.round(self.offsets_s * self.sampFreq).astype(int)
+                self.onsets_Hz = _to_samples(song_dict['onsets'], self.sampFreq, 1000) - 1
+                self.offsets_Hz = _to_samples(song_dict['offsets'], self.sampFreq, 1000)
             elif file_format == 'koumura':
                 if annote_filename:
                     song_dict = koumura.load_song_annot(annote_filename)
@@ -618,7 +1098,7 @@ class Song:
             self.spectParams = spect_params
             self.segmentParams = segment_params
 
-            spect_maker = Spectrogram(**spect_params)
+            spect_maker = Spectrogram.from_params(spect_params)
             spect, freq_bins, time_bins = spect_maker.make(self.rawAudio,
                                                            self.sampFreq)
             # redundant that I make spect but then throw it away after finding
@@ -632,10 +1112,57 @@ class Song:
                                            segment_params)
             self.onsets_s = onsets
             self.offsets_s = offsets
-            self.onsets_Hz = np.round(self.onsets_s * self.sampFreq).astype(int)
-            self.offsets_Hz = np.round(self.offsets_s * self.sampFreq).astype(int)
+            self.onsets_Hz = _to_samples(self.onsets_s, self.sampFreq)
+            self.offsets_Hz = _to_samples(self.offsets_s, self.sampFreq)
             self.labels = '-' * len(onsets)
 
+    @property
+    def rawAudio(self):
+        """audio from file, loaded the first time it is accessed.
+        To free memory, e.g. when processing many files,
+        use `del song.rawAudio`; it will be loaded again if needed.
+        """
+        raw_audio = self.__dict__.get('_raw_audio')
+        if raw_audio is None:
+            raw_audio = self._load_raw_audio()
+            self._raw_audio = raw_audio
+        return raw_audio
+
+    @rawAudio.deleter
+    def rawAudio(self):
+        self.__dict__.pop('_raw_audio', None)
+
+    def _load_raw_audio(self):
+        """loads audio from file, used by rawAudio"""
+        if self.fileFormat == 'evtaf':
+            raw_audio, _ = evfuncs.load_cbin(self.filename)
+            # convert once here, so Spectrogram.make works with float32
+            # instead of promoting int16 audio to float64.
+            # load_cbin returns a strided view for multi-channel files, so
+            # also make sure syllables are sliced from contiguous memory
+            return np.ascontiguousarray(raw_audio, dtype=np.float32)
+        elif self.fileFormat == 'koumura':
+            # memory-map .wav files, so only the samples that get used,
+            # e.g. for syllables, are read from disk.
+            # make_syl_spects converts those samples to float32
+            _, raw_audio = wavfile.read(self.filename, mmap=True)
+            return raw_audio
+
+    @property
+    def sampFreq(self):
+        """sampling frequency of audio file,
+        read from file header (without loading audio)
+        the first time it is accessed
+        """
+        samp_freq = self.__dict__.get('_samp_freq')
+        if samp_freq is None:
+            if self.fileFormat == 'evtaf':
+                samp_freq = evfuncs.readrecf(self.filename[:-5] + '.rec')['sample_freq']
+            elif self.fileFormat == 'koumura':
+                samp_freq, _ = wavfile.read(self.filename, mmap=True)
+            self._samp_freq = samp_freq
+        return samp_freq
+
     def set_syls_to_use(self, labels_to_use='all'):
         """        
         Parameters
@@ -662,8 +1189,22 @@ class Song:
         if labels_to_use == 'all':
             self.syls_to_use = np.ones((self.onsets_s.shape),dtype=bool)
         else:
-            self.syls_to_use = np.in1d(list(self.labels),
-                                       labels_to_use)
+            if all(isinstance(label, str) and len(label) == 1 and ord(label) < 256
+                   for label in self.labels):
+                # every label is a single character, so use each label's
+                # character code to index into a lookup table;
+                # faster than np.in1d, which sorts both arrays
+                label_codes = np.frombuffer(''.join(self.labels).encode('latin-1'),
+                                            dtype=np.uint8)
+                use_label_code = np.zeros(256, dtype=bool)
+                for label in labels_to_use:
+                    # any other label can't match a single character
+                    if isinstance(label, str) and len(label) == 1 and ord(label) < 256:
+                        use_label_code[ord(label)] = True
+                self.syls_to_use = use_label_code[label_codes]
+            else:
+                self.syls_to_use = np.in1d(list(self.labels),
+                                           labels_to_use)
 
     def make_syl_spects(self,
                         spect_params,
@@ -708,15 +1249,10 @@ class Song:
             raise ValueError('Must set syls_to_use by calling set_syls_to_use method '
                              'before calling get_syls.')
 
-        if not hasattr(self, 'raw_audio') and not hasattr(self, 'sampFreq'):
-            if self.fileFormat == 'evtaf':
-                    raw_audio, samp_freq = evfuncs.load_cbin(self.filename)
-            elif self.fileFormat == 'koumura':
-                samp_freq, raw_audio = wavfile.read(self.filename)
-            self.rawAudio = raw_audio
-            self.sampFreq = samp_freq
-
-        if syl_spect_width > 0:
+        raw_audio = self.rawAudio
+        file_len = raw_audio.shape[-1]
+        has_width = syl_spect_width > 0
+        if has_width:
             if syl_spect_width > 1:
                 warnings.warn('syl_spect_width set greater than 1; note that '
                               'this parameter is in units of seconds, so using '
@@ -725,17 +1261,18 @@ class Song:
                               'the spectrogram, and additionally consume a lot '
                               'of memory.')
             syl_spect_width_Hz = int(syl_spect_width * self.sampFreq)
-            if syl_spect_width_Hz > self.rawAudio.shape[-1]:
+            if syl_spect_width_Hz > file_len:
                 raise ValueError('syl_spect_width, converted to samples, '
                                  'is longer than song file {}.'
                                  .format(self.filename))
 
-        all_syls = []
-
-        spect_maker = Spectrogram(**spect_params)
+        spect_maker = Spectrogram.from_params(spect_params)
 
+        # first get audio for every syllable, then make all spectrograms at
+        # once so the FFT is run on segments from all syllables together
+        syls_audio = []
         for ind, (label, onset, offset) in enumerate(zip(self.labels, self.onsets_Hz, self.offsets_Hz)):
-            if 'syl_spect_width_Hz' in locals():
+            if has_width:
                 syl_duration_in_samples = offset - onset
                 if syl_duration_in_samples > syl_spect_width_Hz:
                     raise ValueError('syllable duration of syllable {} with label {} '
@@ -744,7 +1281,7 @@ class Song:
                                      .format(ind, label, self.filename))
 
             if self.syls_to_use[ind]:
-                if 'syl_spect_width_Hz' in locals():
+                if has_width:
                     width_diff = syl_spect_width_Hz - syl_duration_in_samples
                     # take half of difference between syllable duration and spect width
                     # so one half of 'empty' area will be on one side of spect
@@ -754,40 +1291,54 @@ class Song:
                     right_width = width_diff - left_width
                     if left_width > onset:  # if duration before onset is less than left_width
                         # (could happen with first onset)
-                        syl_audio = self.rawAudio[0:syl_spect_width_Hz]
-                    elif offset + right_width > self.rawAudio.shape[-1]:
+                        syl_audio = raw_audio[0:syl_spect_width_Hz]
+                    elif offset + right_width > file_len:
                         # if right width greater than length of file
-                        syl_audio = self.rawAudio[-syl_spect_width_Hz:]
+                        syl_audio = raw_audio[-syl_spect_width_Hz:]
                     else:
-                        syl_audio = self.rawAudio[onset - left_width:offset + right_width]
+                        syl_audio = raw_audio[onset - left_width:offset + right_width]
                 else:
-                    syl_audio = self.rawAudio[onset:offset]
+                    syl_audio = raw_audio[onset:offset]
+                # no copy if rawAudio is already contiguous float32;
+                # if rawAudio is memory-mapped, only reads this syllable's
+                # samples from disk
+                syl_audio = np.ascontiguousarray(syl_audio, dtype=np.float32)
 
-                try:
-                    spect, freq_bins, time_bins = spect_maker.make(syl_audio,
-                                                                   self.sampFreq)
-                except WindowError as err:
-                    warnings.warn('Segment {0} in {1} with label {2} '
-                                  'not long enough for window function'
-                                  ' set with current spect_params.\n'
-                                  'spect will be set to nan.'
-                                  .format(ind, self.filename, label))
-                    spect, freq_bins, time_bins = (np.nan,
+                syls_audio.append((ind, label, syl_audio))
+
+        spects, freq_bins, syls_time_bins = spect_maker.make_batch(
+            [syl_audio for _, _, syl_audio in syls_audio],
+            self.sampFreq)
+
+        all_syls = []
+        for (ind, label, syl_audio), spect, time_bins in zip(syls_audio,
+                                                             spects,
+                                                             syls_time_bins):
+            if spect is None:  # because segment raised WindowError
+                warnings.warn('Segment {0} in {1} with label {2} '
+                              'not long enough for window function'
+                              ' set with current spect_params.\n'
+                              'spect will be set to nan.'
+                              .format(ind, self.filename, label))
+                spect, syl_freq_bins, time_bins = (np.nan,
                                                    np.nan,
                                                    np.nan)
+            else:
+                syl_freq_bins = freq_bins
+
+            curr_syl = syllable(syl_audio,
+                                self.sampFreq,
+                                spect,
+                                spect_maker.nperseg,
+                                spect_maker.noverlap,
+                                spect_maker.freqCutoffs,
+                                syl_freq_bins,
+                                time_bins,
+                                ind,
+                                label)
+
+            all_syls.append(curr_syl)
 
-                curr_syl = syllable(syl_audio,
-                                    self.sampFreq,
-                                    spect,
-                                    spect_maker.nperseg,
-                                    spect_maker.noverlap,
-                                    spect_maker.freqCutoffs,
-                                    freq_bins,
-                                    time_bins,
-                                    ind,
-                                    label)
-
-                all_syls.append(curr_syl)
         if set_syl_spects:
             self.syls = all_syls
 
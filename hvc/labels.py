@@ -0,0 +1,117 @@
+"""
+functions for converting labels to integer codes and back,
+e.g. so metrics compare integers instead of strings
+"""
+
+import numpy as np
+
+
+def lookup_codes(labels, labelset):
+    """finds index of each label in labelset.
+    Unlike labels_to_codes, labels that are not in labelset
+    don't raise an error, e.g. so metrics can ignore them.
+
+    Parameters
+    ----------
+    labels : str, list of str, or 1-d numpy array
+    labelset : str, list of str, or 1-d numpy array
+
+    Returns
+    -------
+    codes : 1-d numpy array of ints
+        index in labelset of each label, -1 where label is not in labelset
+    in_labelset : 1-d numpy array of bools
+        True where label is in labelset
+    """
+
+    labelset = np.asarray(list(labelset))
+    if type(labels) == str:
+        # every label is one character, so get code points without
+        # converting each character to a numpy string
+        code_points = np.frombuffer(labels.encode('utf-32-le'), dtype=np.uint32)
+    else:
+        labels = np.asarray(labels)
+        if labels.dtype.kind == 'U' and labels.dtype.itemsize == 4:
+            code_points = np.ascontiguousarray(labels).view(np.uint32)
+        else:
+            code_points = None
+
+    if (code_points is not None and labelset.dtype.kind == 'U'
+            and labelset.dtype.itemsize == 4):
+        # single characters, so use each label's code point to index into
+        # a lookup table; one pass over labels instead of sorting them
+        labelset_code_points = labelset.view(np.uint32)
+        lookup_table = np.full(max(labelset_code_points.max(initial=0),
+                                   255) + 1,
+                               -1, dtype=np.intp)
+        # reversed, so first occurrence in labelset wins if there are duplicates
+        lookup_table[labelset_code_points[::-1]] = np.arange(labelset.shape[-1])[::-1]
+        codes = np.full(code_points.shape, -1, dtype=np.intp)
+        in_table = code_points < lookup_table.shape[-1]
+        codes[in_table] = lookup_table[code_points[in_table]]
+        in_labelset = codes >= 0
+        return codes, in_labelset
+
+    # any other labels, e.g. integers or strings with more than one character
+    if type(labels) == str:
+        labels = np.asarray(list(labels))
+    if labelset.shape[-1] == 0:
+        return (np.full(labels.shape, -1, dtype=np.intp),
+                np.zeros(labels.shape, dtype=bool))
+    # stable sort so first occurrence in labelset wins if there are duplicates
+    sorter = np.argsort(labelset, kind='stable')
+    positions = np.searchsorted(labelset, labels, sorter=sorter)
+    positions[positions == labelset.shape[-1]] = 0
+    codes = sorter[positions]
+    in_labelset = labelset[codes] == labels
+    codes[~in_labelset] = -1
+    return codes, in_labelset
+
+
+def labels_to_codes(labels, labelset):
+    """converts labels to integer codes
+
+    Parameters
+    ----------
+    labels : str, list of str, or 1-d numpy array
+        e.g. labels for syllables from one song, 'iabcdefghjk'
+    labelset : str, list of str, or 1-d numpy array
+        set of unique labels. The code for each label is its index in labelset.
+
+    Returns
+    -------
+    codes : 1-d numpy array
+        of dtype uint8 if there are 256 labels or less in labelset,
+        otherwise of dtype intp
+
+    Raises ValueError if any label is not in labelset.
+    """
+
+    codes, in_labelset = lookup_codes(labels, labelset)
+    if not np.all(in_labelset):
+        raise ValueError('labels not in labelset: {}'
+                         .format(set(np.asarray(list(labels))[~in_labelset])))
+    if len(labelset) <= 256:
+        codes = codes.astype(np.uint8)
+    return codes
+
+
+def codes_to_labels(codes, labelset):
+    """converts integer codes back to labels, inverse of labels_to_codes
+
+    Parameters
+    ----------
+    codes : 1-d numpy array of ints
+    labelset : str, list of str, or 1-d numpy array
+        same labelset used with labels_to_codes
+
+    Returns
+    -------
+    labels : str or 1-d numpy array
+        str if labelset is a str, otherwise numpy array
+    """
+
+    labels = np.asarray(list(labelset))[codes]
+    if type(labelset) == str:
+        return ''.join(labels)
+    return labels
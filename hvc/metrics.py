@@ -1,66 +1,275 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+
 import numpy as np
-import scipy.spatial.distance
 
+from .labels import lookup_codes
+
+try:  # optional, much faster Levenshtein distance implemented in C++
+    from rapidfuzz.distance import Levenshtein as _Levenshtein
+except ImportError:
+    _Levenshtein = None
+
+try:  # only in rapidfuzz >= 3.6, used by lev_np_batch
+    from rapidfuzz.process import cpdist as _cpdist
+except ImportError:
+    _cpdist = None
+
+try:  # optional compiled extension, built by setup.py if Cython is installed
+    from . import _lev
+except ImportError:
+    _lev = None
+
+# _lev_codes compiled with numba (optional), used by lev_np when rapidfuzz
+# is not installed. None until _get_lev_codes_jit is first called, then
+# False if numba is not installed
+_lev_codes_jit = None
 
-def lev_np(source, target):
+
+def _lev_codes(source_codes, target_codes):
+    """Levenshtein distance between two 1-d arrays of integer codes,
+    where len(source_codes) >= len(target_codes).
+    Scalar loops over two preallocated rows; slow in Python,
+    but fast when compiled with numba (see _get_lev_codes_jit).
+    """
+    n_target = target_codes.shape[0]
+    rows = np.empty((2, n_target + 1), dtype=np.int64)
+    for j in range(n_target + 1):
+        rows[0, j] = j
+    prev = 0
+    for i in range(source_codes.shape[0]):
+        curr = 1 - prev
+        rows[curr, 0] = i + 1
+        s = source_codes[i]
+        for j in range(n_target):
+            dist = rows[prev, j] + (s != target_codes[j])  # substitution
+            if rows[prev, j + 1] + 1 < dist:  # insertion
+                dist = rows[prev, j + 1] + 1
+            if rows[curr, j] + 1 < dist:  # deletion
+                dist = rows[curr, j] + 1
+            rows[curr, j + 1] = dist
+        prev = curr
+    return rows[prev, n_target]
+
+
+def _get_lev_codes_jit():
+    """returns _lev_codes compiled with numba, or None if numba is not
+    installed. numba is imported the first time this is called instead of
+    when hvc is imported, since importing numba is slow and most code
+    that imports hvc never computes Levenshtein distances.
+    """
+    global _lev_codes_jit
+    if _lev_codes_jit is None:
+        try:
+            import numba
+        except ImportError:
+            _lev_codes_jit = False
+        else:
+            _lev_codes_jit = numba.njit(cache=True, nogil=True)(_lev_codes)
+    return _lev_codes_jit or None
+
+
+def _lev_myers(source, target):
+    """Levenshtein distance computed with Myers' bit-parallel algorithm
+    (as formulated by Hyyro).
+    Each column of the dynamic programming matrix is represented by
+    bit vectors of its vertical differences, so the whole column is
+    updated with a few integer operations for each item in source.
+    Python integers can have any number of bits, so any len(target) works.
+
+    Myers, G. (1999). A fast bit-vector algorithm for approximate string
+    matching based on dynamic programming. Journal of the ACM, 46(3).
+    """
+    n_target = len(target)
+    mask = (1 << n_target) - 1
+    last_bit = 1 << (n_target - 1)
+    # bit i of match_bits[item] is set if target[i] == item
+    match_bits = {}
+    for ind, item in enumerate(target):
+        match_bits[item] = match_bits.get(item, 0) | (1 << ind)
+
+    pos_vert = mask  # vertical differences that are +1
+    neg_vert = 0  # vertical differences that are -1
+    dist = n_target
+    for item in source:
+        match = match_bits.get(item, 0)
+        x_vert = match | neg_vert
+        x_horiz = (((match & pos_vert) + pos_vert) ^ pos_vert) | match
+        pos_horiz = neg_vert | ~(x_horiz | pos_vert)
+        neg_horiz = pos_vert & x_horiz
+        # distance is in last row, so track its horizontal difference
+        if pos_horiz & last_bit:
+            dist += 1
+        elif neg_horiz & last_bit:
+            dist -= 1
+        # shift in 1 since first row of matrix increases by 1 in each column
+        pos_horiz = ((pos_horiz << 1) | 1) & mask
+        neg_horiz = (neg_horiz << 1) & mask
+        pos_vert = (neg_horiz | ~(x_vert | pos_horiz)) & mask
+        neg_vert = pos_horiz & x_vert
+    return dist
+
+
+def lev_np(source, target, max_d=None):
     """
-    Levenshtein distance measured using numpy  
-    from:
-    https://en.wikibooks.org/wiki/Algorithm_Implementation/Strings/
-    Levenshtein_distance#Python
+    Levenshtein distance.
 
-    Used under Creative Commons Attribution-ShareAlike License.
+    If the rapidfuzz package is installed, its (bit-parallel)
+    implementation is used. Otherwise, if hvc was built with its
+    Cython extension, or if numba is installed, a compiled version is used.
+    Without any of those, Myers' bit-parallel algorithm is computed with
+    Python integers, which is faster than computing the matrix with numpy,
+    one row or one anti-diagonal at a time.
 
     Parameters:
     -----------
     source : string
     target : string
+    max_d : int
+        maximum distance of interest, e.g. when only checking whether
+        predicted labels are close to true labels. If the distance is greater
+        than max_d, returns max_d + 1.
+        Default is None, in which case the distance is always returned.
 
     Returns:
     --------
     Levenshtein distance : integer
     """
+    if _Levenshtein is not None:
+        return _Levenshtein.distance(source, target, score_cutoff=max_d)
+
+    if len(source) == len(target) and tuple(source) == tuple(target):
+        return 0
+
     if len(source) < len(target):
-        return lev_np(target, source)
+        return lev_np(target, source, max_d)
 
     # So now we have len(source) >= len(target).
+    if max_d is not None and len(source) - len(target) > max_d:
+        # need at least that many insertions
+        return max_d + 1
+
     if len(target) == 0:
-        return len(source)
+        dist = len(source)
+
+    elif _lev is not None or _get_lev_codes_jit() is not None:
+        # compiled functions work on integer codes instead of strings
+        unique_labels, codes = np.unique(np.concatenate((np.array(tuple(source)),
+                                                         np.array(tuple(target)))),
+                                         return_inverse=True)
+        source_codes = codes[:len(source)]
+        target_codes = codes[len(source):]
+        if _lev is not None:
+            dist = _lev.lev_codes(source_codes,
+                                  target_codes,
+                                  unique_labels.size)
+        else:
+            dist = int(_get_lev_codes_jit()(source_codes, target_codes))
+
+    else:
+        dist = _lev_myers(source, target)
+
+    if max_d is not None and dist > max_d:
+        return max_d + 1
+    return dist
+
+
+def lev_np_batch(sources, targets, n_jobs=-1):
+    """
+    Levenshtein distance between every pair of strings in sources and targets,
+    e.g. true and predicted labels for every song in a test set.
 
-    # We call tuple() to force strings to be used as sequences
-    # ('c', 'a', 't', 's') - numpy uses them as values by default.
-    source = np.array(tuple(source))
-    target = np.array(tuple(target))
+    Pairs are split across threads. The compiled implementations used by
+    lev_np (rapidfuzz, the Cython extension, or numba) release the GIL,
+    so this is faster than calling lev_np in a loop on machines with
+    multiple cores. Without any of those, pairs are computed one at a time.
 
-    # We use a dynamic programming algorithm, but with the
-    # added optimization that we only need the last two rows
-    # of the matrix.
-    previous_row = np.arange(target.size + 1)
-    for s in source:
-        # Insertion (target grows longer than source):
-        current_row = previous_row + 1
+    Parameters:
+    -----------
+    sources : list of strings
+    targets : list of strings
+        same length as sources
+    n_jobs : int
+        number of threads to use. Default is -1, i.e. one per CPU.
 
-        # Substitution or matching:
-        # Target and source items are aligned, and either
-        # are different (cost of 1), or are the same (cost of 0).
-        current_row[1:] = np.minimum(
-                current_row[1:],
-                np.add(previous_row[:-1], target != s))
+    Returns:
+    --------
+    distances : 1-d numpy array of integers
+        Levenshtein distance between sources[i] and targets[i]
+    """
+    if len(sources) != len(targets):
+        raise ValueError('sources and targets should have the same length.'
+                         'len(sources) is {} and len(targets) is {}'
+                         .format(len(sources), len(targets)))
 
-        # Deletion (target grows shorter than source):
-        current_row[1:] = np.minimum(
-                current_row[1:],
-                current_row[0:-1] + 1)
+    if n_jobs == -1:
+        n_jobs = os.cpu_count()
 
-        previous_row = current_row
+    if _Levenshtein is not None and _cpdist is not None:
+        return _cpdist(sources, targets,
+                       scorer=_Levenshtein.distance,
+                       workers=n_jobs).astype(int)
 
-    return previous_row[-1]
+    if _Levenshtein is None and _lev is None and _get_lev_codes_jit() is None:
+        return np.array([lev_np(source, target)
+                         for source, target in zip(sources, targets)],
+                        dtype=int)
+
+    with ThreadPoolExecutor(max_workers=n_jobs) as executor:
+        return np.fromiter(executor.map(lev_np, sources, targets),
+                           dtype=int,
+                           count=len(sources))
+
+
+def average_accuracy_codes(true_codes, pred_codes, n_labels):
+    """
+    computes accuracy averaged across classes, given labels as integer codes,
+    e.g. returned by hvc.labels.labels_to_codes
+
+    Parameters
+    ----------
+    true_codes : 1-d numpy array of ints
+        ground truth, codes in range(n_labels)
+    pred_codes : 1-d numpy array of ints
+        predicted codes, same shape as true_codes
+    n_labels : int
+        number of labels in labelset
+
+    Returns
+    -------
+    acc_by_label : nd_array
+        1-d vector of accuracies, one for each code in range(n_labels)
+    avg_acc : scalar
+        average accuracy across labels, i.e., numpy.mean(acc_by_label)
+    """
+
+    true_codes = np.asarray(true_codes)
+    pred_codes = np.asarray(pred_codes)
+    if true_codes.shape != pred_codes.shape:
+        raise ValueError('true_codes and pred_codes should have the same shape.'
+                         'true_codes.shape is {} and pred_codes.shape is {}'
+                         .format(true_codes.shape, pred_codes.shape))
+
+    # number of true positives for each label
+    n_matches = np.bincount(true_codes,
+                            weights=(true_codes == pred_codes),
+                            minlength=n_labels)
+    # number of true positives and false negatives for each label
+    n_label = np.bincount(true_codes, minlength=n_labels)
+    # accuracy is left as zero if there were no instances of label in labels
+    acc_by_label = np.zeros(n_label.shape)
+    np.divide(n_matches, n_label, out=acc_by_label, where=n_label > 0)
+    avg_acc = np.mean(acc_by_label)
+    return acc_by_label, avg_acc
 
 
 def average_accuracy(true_labels, pred_labels, labelset):
     """
     computes accuracy averaged across classes
 
+    Converts labels to integer codes and calls average_accuracy_codes.
+    Labels in true_labels that are not in labelset are ignored.
+
     Parameters
     ----------
     true_labels : list of strings
@@ -69,7 +278,7 @@ def average_accuracy(true_labels, pred_labels, labelset):
     pred_labels : list of strings
         vector of predicted labels returned by algorithm given samples from test data set
     
-    labelset : list of chars
+    labelset : str or list of chars
         set of unique labels from data set, i.e., numpy.unique(true_labels)
 
     Returns
@@ -80,17 +289,25 @@ def average_accuracy(true_labels, pred_labels, labelset):
         average accuracy across labels, i.e., numpy.mean(acc_by_label)
     """
 
-    acc_by_label = np.zeros((len(labelset)))
-    for ind,label in enumerate(labelset):
-        label_ids = np.in1d(true_labels,label) #find all occurences of label in test data
-        if sum(label_ids) == 0: # if there were no instances of label in labels
-            continue
-        pred_for_that_label = pred_labels[label_ids]
-        matches = pred_for_that_label==label
-        #sum(matches) is equal to number of true positives
-        #len(matches) is equal to number of true positives and false negatives
-        acc = sum(matches) / len(matches)
-        acc_by_label[ind] = acc
+    true_labels = np.asarray(true_labels)
+    pred_labels = np.asarray(pred_labels)
+    if true_labels.shape != pred_labels.shape:
+        raise ValueError('true_labels and pred_labels should have the same shape.'
+                         'true_labels.shape is {} and pred_labels.shape is {}'
+                         .format(true_labels.shape, pred_labels.shape))
+
+    # codes index into unique labels, so duplicates in labelset share a code.
+    # list() so a str labelset is a sequence of single-character labels
+    unique_labels, labelset_inds = np.unique(list(labelset), return_inverse=True)
+    n_labels = unique_labels.shape[-1]
+    true_codes, in_labelset = lookup_codes(true_labels, unique_labels)
+    pred_codes, _ = lookup_codes(pred_labels, unique_labels)
+    # predicted labels not in labelset never match a true code
+    pred_codes[pred_codes < 0] = n_labels
+    acc_by_label, _ = average_accuracy_codes(true_codes[in_labelset],
+                                             pred_codes[in_labelset],
+                                             n_labels)
+    acc_by_label = acc_by_label[labelset_inds]
     avg_acc = np.mean(acc_by_label)
     return acc_by_label,avg_acc
 
@@ -103,7 +320,8 @@ def frame_error(y_true, y_pred):
     Parameters
     ----------
     y_true : 1-dimensional numpy array
-        ground truth
+        ground truth. Integer codes, e.g. from hvc.labels.labels_to_codes,
+        compare faster than strings.
     y_pred : 1-dimensional numpy array
         prediction, output of some model
 
@@ -126,17 +344,18 @@ def frame_error(y_true, y_pred):
                          'y_true.shape is {} and y_pred.shape is {}'
                          .format(y_true.shape,y_pred.shape))
 
-    return 1 - sum(y_true == y_pred) / y_true.shape[-1]
+    return 1.0 - np.count_nonzero(y_true == y_pred) / float(y_true.shape[-1])
 
 
 def hamming_dist(y_true, y_pred):
-    """Hamming distance. Number of substitutions required to convert y_pred to y_true (or vice versa).
-    Just a wrapper around scipy.spatial.distance.hamming.
+    """Hamming distance. Number of substitutions required to convert y_pred to y_true (or vice versa),
+    divided by the length of y_true, i.e. the same as scipy.spatial.distance.hamming.
 
     Parameters
     ----------
     y_true : 1-dimensional numpy array
-        ground truth
+        ground truth. Integer codes, e.g. from hvc.labels.labels_to_codes,
+        compare faster than strings.
     y_pred : 1-dimensional numpy array
         prediction, output of some model
 
@@ -160,4 +379,4 @@ def hamming_dist(y_true, y_pred):
                          'y_true.shape is {} and y_pred.shape is {}'
                          .format(y_true.shape,y_pred.shape))
 
-    return scipy.spatial.distance.hamming(y_true, y_pred)
+    return np.count_nonzero(y_true != y_pred) / float(y_true.shape[-1])
@@ -62,8 +62,8 @@ def validate_spect_params(spect_params):
                 valid strings are 'Hann', 'dpss', None
                 Hann -- Uses np.Hanning with parameter M (window width) set to value of nperseg
                 dpss -- Discrete prolate spheroidal sequence AKA Slepian.
-                    Uses scipy.signal.slepian with M parameter equal to nperseg and
-                    width parameter equal to 4/nperseg, as in [2]_.
+                    Uses scipy.signal.windows.dpss with M parameter equal to nperseg and
+                    NW parameter equal to 2, i.e. a width of 4/nperseg as in [2]_.
             filter_func : str
                 filter to apply to raw audio. valid strings are 'diff' or None
                 'diff' -- differential filter, literally np.diff applied to signal as in [1]_.
@@ -71,8 +71,9 @@ def validate_spect_params(spect_params):
             spect_func : str
                 which function to use for spectrogram.
                 valid strings are 'scipy' or 'mpl'.
-                'scipy' uses scipy.signal.spectrogram,
-                'mpl' uses matplotlib.matlab.specgram.
+                'scipy' computes the same spectrogram as scipy.signal.spectrogram,
+                'mpl' computes the same spectrogram as matplotlib.mlab.specgram.
+                Both are computed with scipy.fft.rfft on all segments at once.
                 Default is 'scipy'.
             ref : str
                 {'tachibana','koumura'}
@@ -1,6 +1,28 @@
 #!/usr/bin/env python
 
-from distutils.core import setup
+from distutils.core import setup, Extension
+from distutils.version import LooseVersion
+
+# optional, compiled Levenshtein distance used by hvc.metrics.lev_np.
+# hvc/_lev.pyx uses `noexcept`, which needs Cython >= 0.29.31
+MIN_CYTHON_VERSION = '0.29.31'
+
+try:
+    import Cython
+    from Cython.Build import cythonize
+except ImportError:
+    Cython = None
+
+if Cython is not None and LooseVersion(Cython.__version__) >= LooseVersion(MIN_CYTHON_VERSION):
+    ext_modules = cythonize([Extension('hvc._lev', ['hvc/_lev.pyx'])])
+    for ext in ext_modules:
+        # so build_ext skips the extension instead of failing the install
+        # if it can't be compiled, e.g. without a C compiler.
+        # Set here, since cythonize doesn't copy it to the Extensions it returns
+        ext.optional = True
+else:
+    # without Cython, hvc.metrics.lev_np uses a Python implementation
+    ext_modules = []
 
 setup(name='Hybrid Vocal Classifier',
       version='1.0',
@@ -9,5 +31,5 @@ setup(name='Hybrid Vocal Classifier',
       author_email='nicholdav at gmail dot com',
       url='https://github.com/NickleDave/hybrid-vocal-classifier',
       packages=['hvc','hvc.neuralnet'],
+      ext_modules=ext_modules,
       )
-      
@@ -2,6 +2,9 @@
 test audiofileIO module
 """
 
+import pickle
+from concurrent.futures import ThreadPoolExecutor
+
 import pytest
 from scipy.io import wavfile
 import numpy as np
@@ -47,6 +50,78 @@ class TestAudiofileIO:
         with pytest.warns(UserWarning):
             spect_maker = hvc.audiofileIO.Spectrogram(spect_func='scipy',
                                                       ref='tachibana')
+        # and that the other params get over-written
+        assert spect_maker.spectFunc == 'mpl'
+        assert spect_maker.nperseg == 256
+
+        # test that from_ref returns the same object every time
+        spect_maker = hvc.audiofileIO.Spectrogram.from_ref('koumura')
+        assert spect_maker.nperseg == 512
+        assert spect_maker is hvc.audiofileIO.Spectrogram.from_ref('koumura')
+
+        # and same for from_params, regardless of order of keys
+        spect_maker = hvc.audiofileIO.Spectrogram.from_params(
+            {'nperseg': 512, 'noverlap': 480, 'freq_cutoffs': [1000, 8000]})
+        assert spect_maker.freqCutoffs == [1000, 8000]
+        assert spect_maker is hvc.audiofileIO.Spectrogram.from_params(
+            {'freq_cutoffs': [1000, 8000], 'noverlap': 480, 'nperseg': 512})
+        assert spect_maker is not hvc.audiofileIO.Spectrogram.from_params(
+            {'nperseg': 512, 'noverlap': 480, 'freq_cutoffs': [500, 8000]})
+        # keeps its own copy of freq_cutoffs, since it is shared
+        freq_cutoffs = [1000, 8000]
+        spect_maker = hvc.audiofileIO.Spectrogram.from_params(
+            {'nperseg': 512, 'noverlap': 480, 'freq_cutoffs': freq_cutoffs})
+        freq_cutoffs[0] = 500
+        assert spect_maker.freqCutoffs == [1000, 8000]
+
+        # warns every time, not only when the object is first made
+        for _ in range(2):
+            with pytest.warns(UserWarning):
+                hvc.audiofileIO.Spectrogram.from_params({'ref': 'tachibana',
+                                                         'nperseg': 512})
+
+    def test_Spectrogram_precision(self):
+        """test that only thresholded log PSDs are computed in single precision
+        """
+        cbin = './test_data/cbins/gy6or6/032412/gy6or6_baseline_240312_0811.1165.cbin'
+        dat, fs = hvc.evfuncs.load_cbin(cbin)
+        for spect_params, dtype in [({'ref': 'koumura'}, np.float64),
+                                    ({'ref': 'tachibana'}, np.complex128),
+                                    ({'nperseg': 512, 'noverlap': 480}, np.float32),
+                                    ({'nperseg': 512, 'noverlap': 480,
+                                      'thresh': -40.0}, np.float64),
+                                    ({'nperseg': 512, 'noverlap': 480,
+                                      'log_transform_spect': False}, np.float64)]:
+            spect_maker = hvc.audiofileIO.Spectrogram(**spect_params)
+            spect, _, _ = spect_maker.make(dat, fs)
+            assert spect.dtype == dtype
+            if dtype != np.complex128:
+                # (bandpass filter for tachibana isn't stable over a whole file)
+                assert np.all(np.isfinite(spect))
+
+    def test_Spectrogram_window_cache(self):
+        """test that windows are computed once and shared across instances
+        """
+        spect_maker1 = hvc.audiofileIO.Spectrogram(ref='koumura')
+        spect_maker2 = hvc.audiofileIO.Spectrogram(nperseg=512,
+                                                   noverlap=480,
+                                                   window='dpss')
+        assert spect_maker1.window is spect_maker2.window
+        assert not spect_maker1.window.flags.writeable
+
+        # test that unpickling a Spectrogram, e.g. in another process,
+        # puts its window in the cache of the process where it is unpickled
+        pickled = pickle.dumps(spect_maker1)
+        for dtype in ('float32', 'float64'):
+            del hvc.audiofileIO._WINDOW_CACHE[('dpss', 512, dtype)]
+        spect_maker1 = pickle.loads(pickled)
+        spect_maker2 = hvc.audiofileIO.Spectrogram(nperseg=512,
+                                                   noverlap=480,
+                                                   window='dpss')
+        assert spect_maker1.window is spect_maker2.window
+        # koumura has no thresh, so it is computed in float64 with the same window
+        assert spect_maker1._window is spect_maker1.window
+        assert not spect_maker1.window.flags.writeable
 
     def test_Spectrogram_make(self, has_window_error):
         """ test whether Spectrogram.make works
@@ -79,6 +154,13 @@ class TestAudiofileIO:
         assert spect.shape[0] == freq_bins.shape[0]
         assert spect.shape[1] == time_bins.shape[0]
 
+        # scratch memory for segments of a long file is not kept
+        spect_maker.make(np.tile(dat, 2), fs)
+        segments_buf = getattr(spect_maker._scratch, 'segments_buf', None)
+        assert (segments_buf is None or
+                segments_buf.nbytes <=
+                hvc.audiofileIO._SEGMENTS_BUF_MAX_BYTES)
+
         # test custom exceptions
         filename, index = has_window_error
         dat, fs = hvc.evfuncs.load_cbin(filename)
@@ -92,6 +174,70 @@ class TestAudiofileIO:
         with pytest.raises(hvc.audiofileIO.WindowError):
             spect_maker.make(raw_audio, fs)
 
+    def test_Spectrogram_make_batch(self, has_window_error):
+        """test that make_batch gives same spectrograms as make
+        """
+        filename, index = has_window_error
+        dat, fs = hvc.evfuncs.load_cbin(filename)
+        notmat_dict = hvc.evfuncs.load_notmat(filename)
+        onsets = np.round(notmat_dict['onsets'] / 1000 * fs).astype(int)
+        offsets = np.round(notmat_dict['offsets'] / 1000 * fs).astype(int)
+        raw_audios = [dat[onset:offset]
+                      for onset, offset in zip(onsets, offsets)]
+
+        for ref in ('tachibana', 'koumura'):
+            spect_maker = hvc.audiofileIO.Spectrogram(ref=ref)
+            spects, freq_bins, time_bins = spect_maker.make_batch(raw_audios, fs)
+            assert len(spects) == len(raw_audios)
+            for ind, raw_audio in enumerate(raw_audios):
+                if ref == 'koumura' and ind == index:
+                    assert spects[ind] is None
+                    assert time_bins[ind] is None
+                    continue
+                spect, freq_bins_make, time_bins_make = spect_maker.make(raw_audio,
+                                                                         fs)
+                assert np.array_equal(spects[ind], spect, equal_nan=True)
+                assert np.array_equal(freq_bins, freq_bins_make)
+                assert np.array_equal(time_bins[ind], time_bins_make)
+            # spects are copies, not views of one array for the whole batch
+            spects = [spect for spect in spects if spect is not None]
+            assert not any(np.shares_memory(spects[0], spect)
+                           for spect in spects[1:])
+
+        # waveforms that are all the same length are filtered together
+        for width in (200, 2000):  # shorter and longer than window
+            raw_audios = [dat[onset:onset + width] for onset in onsets]
+            for ref in ('tachibana', 'koumura'):
+                spect_maker = hvc.audiofileIO.Spectrogram(ref=ref)
+                spects, freq_bins, time_bins = spect_maker.make_batch(raw_audios,
+                                                                      fs)
+                for ind, raw_audio in enumerate(raw_audios):
+                    if ref == 'koumura' and width == 200:
+                        assert spects[ind] is None
+                        continue
+                    spect, _, time_bins_make = spect_maker.make(raw_audio, fs)
+                    assert np.array_equal(spects[ind], spect, equal_nan=True)
+                    assert np.array_equal(time_bins[ind], time_bins_make)
+
+    def test_Spectrogram_make_threads(self):
+        """test that threads sharing a Spectrogram get the same
+        spectrograms as one thread, since each has its own scratch memory
+        """
+        cbin = './test_data/cbins/gy6or6/032412/gy6or6_baseline_240312_0811.1165.cbin'
+        dat, fs = hvc.evfuncs.load_cbin(cbin)
+        raw_audios = [dat[start:start + length]
+                      for start, length in zip(range(0, 64000, 8000),
+                                               range(4000, 12000, 1000))]
+        spect_maker = hvc.audiofileIO.Spectrogram.from_params({'ref': 'koumura'})
+        expected = [spect_maker.make(raw_audio, fs)[0]
+                    for raw_audio in raw_audios]
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            spects = list(executor.map(lambda raw_audio:
+                                       spect_maker.make(raw_audio, fs)[0],
+                                       raw_audios * 4))
+        for spect, spect_expected in zip(spects, expected * 4):
+            assert np.array_equal(spect, spect_expected)
+
     def test_Song_init(self):
         """test whether Song object inits properly
         """
@@ -107,9 +253,18 @@ class TestAudiofileIO:
                                     file_format='evtaf',
                                     segment_params=segment_params)
 
+        # audio is only loaded when needed
+        assert '_raw_audio' not in song.__dict__
+        assert song.sampFreq == 32000
+        assert song.rawAudio.dtype == np.float32
+        assert song.rawAudio is song.rawAudio  # only loaded once
+        del song.rawAudio
+        assert '_raw_audio' not in song.__dict__
+
         wav = './test_data/koumura/Bird0/Wave/0.wav'
         song = hvc.audiofileIO.Song(filename=wav,
                                     file_format='koumura')
+        assert '_raw_audio' not in song.__dict__
 
 
     def test_Song_set_and_make_syls(self):
@@ -134,6 +289,11 @@ class TestAudiofileIO:
                                          segment_params=segment_params)
         cbin_song.set_syls_to_use('iabcdefghjk')
         cbin_song.make_syl_spects(spect_params)
+        for syl in cbin_song.syls:
+            # should be views of contiguous float32 rawAudio, not copies
+            assert syl.sylAudio.dtype == np.float32
+            assert syl.sylAudio.flags.c_contiguous
+            assert np.shares_memory(syl.sylAudio, cbin_song.rawAudio)
 
         wav = './test_data/koumura/Bird0/Wave/0.wav'
         wav_song = hvc.audiofileIO.Song(filename=wav,
@@ -141,12 +301,33 @@ class TestAudiofileIO:
         wav_song.set_syls_to_use('0123456')
         wav_song.make_syl_spects(spect_params)
 
+        # labels that aren't all single characters
+        cbin_song.labels = ['ab', '']
+        cbin_song.set_syls_to_use(['a', 'b'])
+        assert np.array_equal(cbin_song.syls_to_use, [False, False])
+        cbin_song.labels = ['ab', 'c', 'a']
+        cbin_song.set_syls_to_use(['ab', 'c'])
+        assert np.array_equal(cbin_song.syls_to_use, [True, True, False])
+        cbin_song.labels = [1, 2, 3]
+        cbin_song.set_syls_to_use([1, 3])
+        assert np.array_equal(cbin_song.syls_to_use, [True, False, True])
+
         # test make_syl_spects works with 'ref' set to 'tachibana'
         cbin_song = hvc.audiofileIO.Song(filename=cbin,
                                          file_format='evtaf',
                                          segment_params=segment_params)
         cbin_song.set_syls_to_use('iabcdefghjk')
         cbin_song.make_syl_spects(spect_params={'ref': 'tachibana'})
+        for syl in cbin_song.syls:
+            # complex spectrum stays double precision, since features
+            # square its magnitude, which would overflow complex64
+            assert syl.spect.dtype == np.complex128
+            assert np.all(np.isfinite(np.abs(syl.spect) ** 2))
+        spects = cbin_song.make_syl_spects(spect_params={'ref': 'tachibana'},
+                                           syl_spect_width=0.3,
+                                           return_spects=True)
+        for spect in spects:
+            assert np.all(np.isfinite(np.abs(spect) ** 2))
 
         wav = './test_data/koumura/Bird0/Wave/0.wav'
         wav_song = hvc.audiofileIO.Song(filename=wav,
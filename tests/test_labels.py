@@ -0,0 +1,58 @@
+"""
+test labels module
+"""
+import numpy as np
+import pytest
+
+import hvc.labels
+
+
+class TestLabels:
+
+    def test_labels_to_codes(self):
+        codes = hvc.labels.labels_to_codes('iabcci', 'abci')
+        assert codes.dtype == np.uint8
+        assert np.array_equal(codes, [3, 0, 1, 2, 2, 3])
+        # numpy arrays and lists give the same codes as str
+        assert np.array_equal(
+            hvc.labels.labels_to_codes(np.array(list('iabcci')), list('abci')),
+            codes)
+        assert np.array_equal(
+            hvc.labels.labels_to_codes(list('iabcci'), np.array(list('abci'))),
+            codes)
+        # labels with more than one character
+        codes = hvc.labels.labels_to_codes(['i', 'ab', 'c', 'ab'],
+                                           ['ab', 'c', 'i'])
+        assert np.array_equal(codes, [2, 0, 1, 0])
+        # integer labels
+        assert np.array_equal(hvc.labels.labels_to_codes([10, 2, 10], [2, 10]),
+                              [1, 0, 1])
+        with pytest.raises(ValueError):
+            hvc.labels.labels_to_codes('iabz', 'abci')
+        with pytest.raises(ValueError):
+            hvc.labels.labels_to_codes(['ab', 'x'], ['ab', 'c'])
+
+    def test_lookup_codes(self):
+        codes, in_labelset = hvc.labels.lookup_codes('iazb', 'abci')
+        assert np.array_equal(codes, [3, 0, -1, 1])
+        assert np.array_equal(in_labelset, [True, True, False, True])
+        codes, in_labelset = hvc.labels.lookup_codes(['ab', 'x'], ['c', 'ab'])
+        assert np.array_equal(codes, [1, -1])
+        assert np.array_equal(in_labelset, [True, False])
+
+    def test_labels_to_codes_large_labelset(self):
+        labelset = [chr(code_point) for code_point in range(1000, 1300)]
+        labels = labelset[::-1] * 2
+        codes = hvc.labels.labels_to_codes(labels, labelset)
+        assert codes.dtype == np.intp
+        assert np.array_equal(codes, list(range(299, -1, -1)) * 2)
+
+    def test_codes_to_labels(self):
+        labelset = 'abci'
+        labels = 'iabccibaa'
+        codes = hvc.labels.labels_to_codes(labels, labelset)
+        assert hvc.labels.codes_to_labels(codes, labelset) == labels
+        labelset = ['ab', 'c', 'i']
+        labels = ['i', 'ab', 'c', 'ab']
+        codes = hvc.labels.labels_to_codes(labels, labelset)
+        assert list(hvc.labels.codes_to_labels(codes, labelset)) == labels
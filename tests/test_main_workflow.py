@@ -6,10 +6,9 @@ and this seemed like the easiest, least fragile way to do taht
 """
 
 import os
-import glob
+import re
 
 import pytest
-import numpy as np
 from sklearn.externals import joblib
 
 import hvc
@@ -52,86 +51,107 @@ def rewrite_config(config_dir,
 
     config_file_path = os.path.join(configs, config_filename)
 
-    # find key in config dict and replace value for that key
+    # find key in config dict and replace value for that key,
+    # with one pass over the file for all keys
     with open(config_file_path) as config_file:
-        config_as_list = config_file.readlines()
-    for key, val_tuple in replace_dict.items():
-        for ind, line in enumerate(config_as_list):
+        config_text = config_file.read()
+    key_lines = re.compile('^.*(?:{}).*$'.format(
+        '|'.join(re.escape(key) for key in replace_dict)),
+        flags=re.MULTILINE)
+
+    def replace_vals(line_match):
+        line = line_match.group()
+        for key, val_tuple in replace_dict.items():
             if key in line:
-                config_as_list[ind] = config_as_list[ind].replace(
-                    val_tuple[0],
-                    val_tuple[1]
-                )
+                line = line.replace(val_tuple[0], val_tuple[1])
+        return line
+
+    config_text = key_lines.sub(replace_vals, config_text)
 
     # write to file in temporary configs dir
     tmp_config_path = os.path.join(str(config_dir), config_filename)
     with open(tmp_config_path, 'w') as tmp_config_file:
-        tmp_config_file.writelines(config_as_list)
+        tmp_config_file.write(config_text)
     # return location of that file
     return tmp_config_path
 
 
+def newest_dir(parent_dir, name_contains):
+    """returns path of most recently modified directory in parent_dir
+    whose name contains name_contains.
+    Uses os.scandir, since DirEntry objects cache results of stat calls
+    """
+
+    dir_entries = [entry for entry in os.scandir(str(parent_dir))
+                   if name_contains in entry.name
+                   and entry.is_dir(follow_symlinks=False)]
+    return max(dir_entries, key=lambda entry: entry.stat().st_mtime).path
+
+
 def check_extract_output(output_dir):
     """
     """
 
-    ftr_files = glob.glob(os.path.join(output_dir, 'features_from*'))
-    ftr_dicts = []
+    ftr_files = [entry.path for entry in os.scandir(output_dir)
+                 if entry.name.startswith('features_from')]
+    # load feature files one at a time and keep only what is needed
+    # for the checks below, instead of keeping every feature dict in memory
+    has_features = []
+    ftr_cols = set()
+    total_ftr_dict_rows = 0
+    has_neuralnet_inputs = []
+    neuralnet_keysets = []
+    total_neuralnet_rows = {}
     for ftr_file in ftr_files:
-        ftr_dicts.append(joblib.load(ftr_file))
+        ftr_dict = joblib.load(ftr_file)
+        labels = ftr_dict['labels']
 
-    # if features were extracted (not spectrograms)
-    if any(['features' in ftr_dict for ftr_dict in ftr_dicts]):
-        # then all ftr_dicts should have `features` key
-        assert all(['features' in ftr_dict for ftr_dict in ftr_dicts])
-        # and the number of rows in features should equal number of labels
-        for ftr_dict in ftr_dicts:
-            labels = ftr_dict['labels']
+        # if features were extracted (not spectrograms)
+        has_features.append('features' in ftr_dict)
+        if 'features' in ftr_dict:
             features = ftr_dict['features']
+            # the number of rows in features should equal number of labels
             assert features.shape[0] == len(labels)
+            ftr_cols.add(features.shape[1])
+            total_ftr_dict_rows += features.shape[0]
+
+        # if features are spectrograms for neural net
+        has_neuralnet_inputs.append('neuralnet_inputs' in ftr_dict)
+        if 'neuralnet_inputs' in ftr_dict:
+            neuralnet_keysets.append(set(ftr_dict['neuralnet_inputs'].keys()))
+            for key, val in ftr_dict['neuralnet_inputs'].items():
+                assert val.shape[0] == len(labels)
+                total_neuralnet_rows[key] = (total_neuralnet_rows.get(key, 0)
+                                             + val.shape[0])
 
+    if any(has_features):
+        # then all ftr_dicts should have `features` key
+        assert all(has_features)
         # make sure number of features i.e. columns is constant across feature matrices
-        ftr_cols = [ftr_dict['features'].shape[1] for ftr_dict in ftr_dicts]
-        assert np.unique(ftr_cols).shape[-1] == 1
+        assert len(ftr_cols) == 1
 
-    # if features are spectrograms for neural net
-    if any(['neuralnets_input_dict' in ftr_dict for ftr_dict in ftr_dicts]):
+    if any(has_neuralnet_inputs):
         # then all feature dicts should have spectrograms
-        assert all(['neuralnets_input_dict' in ftr_dict for ftr_dict in ftr_dicts])
-        neuralnet_keys = [ftr_dict['neuralnets_input_dict'].keys()
-                          for ftr_dict in ftr_dicts]
-        # make sure keys are all the same for neuralnets_input_dict from every ftr_dict
-        for ind, keyset in enumerate(neuralnet_keys):
-            other_keysets = neuralnet_keys[:ind] + neuralnet_keys[(ind+1):]
-            assert keyset.difference(other_keysets) == set()
-        # if they are all the same, then save that set of keys
-        # to compare with summary feature dict below
-        neuralnet_keys = neuralnet_keys[0]
-
-        for ftr_dict in ftr_dicts:
-            labels = ftr_dict['labels']
-            for key, val in ftr_dict['neuralnet_inputs_dict']:
-                assert val.shape[0] == len(labels)
+        assert all(has_neuralnet_inputs)
+        # make sure keys are all the same for neuralnet_inputs from every ftr_dict
+        neuralnet_keys = neuralnet_keysets[0]
+        assert all(keyset == neuralnet_keys for keyset in neuralnet_keysets)
 
     # make sure rows in summary dict features == sum of rows of each ftr file features
-    summary_file = glob.glob(os.path.join(output_dir, 'summary_feature_file_*'))
+    summary_file = [entry.path for entry in os.scandir(output_dir)
+                    if entry.name.startswith('summary_feature_file_')]
     # (should only be one summary file)
     assert len(summary_file) == 1
-    summary_dict = joblib.load(summary_file[0])
-    if all(['features' in ftr_dict for ftr_dict in ftr_dicts]):
+    # only shapes are checked, so memory-map arrays instead of reading them
+    summary_dict = joblib.load(summary_file[0], mmap_mode='r')
+    if all(has_features):
         sum_ftr_rows = summary_dict['features'].shape[0]
-        total_ftr_dict_rows = sum([ftr_dict['features'].shape[0]
-                                   for ftr_dict in ftr_dicts])
         assert sum_ftr_rows == total_ftr_dict_rows
 
-    if all(['neuralnets_input_dict' in ftr_dict for ftr_dict in ftr_dicts]):
-        assert summary_dict['neuralnet_inputs_dict'].keys() == neuralnet_keys
-        for key, val in summary_dict['neuralnet_inputs_dict']:
-            sum_ftr_rows = summary_dict['neuralnets_input_dict'][key].shape[0]
-            total_ftr_dict_rows = sum(
-                [ftr_dict['neuralnet_inputs_dict'][key].shape[0]
-                 for ftr_dict in ftr_dicts])
-            assert sum_ftr_rows == total_ftr_dict_rows
+    if all(has_neuralnet_inputs):
+        assert summary_dict['neuralnet_inputs'].keys() == neuralnet_keys
+        for key, val in summary_dict['neuralnet_inputs'].items():
+            assert val.shape[0] == total_neuralnet_rows[key]
 
     return True  # because called with assert
 
@@ -140,8 +160,8 @@ def check_select_output(config_path, output_dir):
     """
     """
 
-    select_output = glob.glob(os.path.join(str(output_dir),
-                                            'summary_model_select_file*'))
+    select_output = [entry.path for entry in os.scandir(str(output_dir))
+                     if entry.name.startswith('summary_model_select_file')]
     # should only be one summary output file
     assert len(select_output) == 1
 
@@ -194,42 +214,25 @@ def test_main_workflow(tmp_config_dir, tmp_output_dir):
                                                             str(tmp_output_dir))},
                                          config_filename=extract_config_filename)
         hvc.extract(tmp_config_path)
-        extract_outputs = list(
-            filter(os.path.isdir, glob.glob(os.path.join(
-                str(tmp_output_dir),
-                '*extract*'))
-                   )
-        )
-        extract_outputs.sort(key=os.path.getmtime)
-        extract_output_dir = (extract_outputs[-1])  # [-1] is newest dir, after sort
+        extract_output_dir = newest_dir(tmp_output_dir, 'extract')
         assert check_extract_output(extract_output_dir)
 
-        feature_file = glob.glob(os.path.join(extract_output_dir, 'summary*'))
-        feature_file = feature_file[0]  # because glob returns list
+        feature_file = [entry.path for entry in os.scandir(extract_output_dir)
+                        if entry.name.startswith('summary')]
+        feature_file = feature_file[0]  # because list comprehension returns list
 
         select_config_filenames = test_config_tuple[1]
 
-        while True:
-            try:
-                select_config_filename = select_config_filenames.pop()
-                tmp_config_path = rewrite_config(tmp_config_dir,
-                                                 replace_dict={'feature_file':
-                                                                   ('replace with feature_file',
-                                                                    feature_file),
-                                                               'output_dir':
-                                                                   ('replace with tmp_output_dir',
-                                                                    str(tmp_output_dir))},
-                                                 config_filename=select_config_filename)
-                hvc.select(tmp_config_path)
-                select_outputs = list(
-                    filter(os.path.isdir, glob.glob(os.path.join(
-                        str(tmp_output_dir),
-                        '*select*'))
-                           )
-                )
-                select_outputs.sort(key=os.path.getmtime)
-                select_output_dir = (select_outputs[-1])  # [-1] is newest dir, after sort
-                assert check_select_output(tmp_config_path, select_output_dir)
-            except IndexError:  # because pop from empty list
-                break
+        for select_config_filename in reversed(select_config_filenames):
+            tmp_config_path = rewrite_config(tmp_config_dir,
+                                             replace_dict={'feature_file':
+                                                               ('replace with feature_file',
+                                                                feature_file),
+                                                           'output_dir':
+                                                               ('replace with tmp_output_dir',
+                                                                str(tmp_output_dir))},
+                                             config_filename=select_config_filename)
+            hvc.select(tmp_config_path)
+            select_output_dir = newest_dir(tmp_output_dir, 'select')
+            assert check_select_output(tmp_config_path, select_output_dir)
 
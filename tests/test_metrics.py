@@ -0,0 +1,171 @@
+"""
+test metrics module
+"""
+import numpy as np
+import pytest
+
+import hvc.labels
+import hvc.metrics
+
+
+def lev_full_matrix(source, target):
+    """Levenshtein distance computed with the whole dynamic programming
+    matrix, to check the faster implementations against"""
+    dist = np.zeros((len(source) + 1, len(target) + 1), dtype=int)
+    dist[:, 0] = np.arange(len(source) + 1)
+    dist[0, :] = np.arange(len(target) + 1)
+    for i in range(1, len(source) + 1):
+        for j in range(1, len(target) + 1):
+            dist[i, j] = min(dist[i - 1, j] + 1,
+                             dist[i, j - 1] + 1,
+                             dist[i - 1, j - 1] + (source[i - 1] != target[j - 1]))
+    return dist[-1, -1]
+
+
+@pytest.fixture()
+def label_strings():
+    """pairs of label strings, like those compared when
+    measuring syllable error rate"""
+    rng = np.random.RandomState(42)
+    pairs = [('', ''), ('', 'iab'), ('iab', ''), ('kitten', 'sitting'),
+             ('iabcdefghjk', 'iabcdefghjk')]
+    for _ in range(100):
+        len1, len2 = rng.randint(0, 90, size=2)
+        source = ''.join(rng.choice(list('iabcdefghjk'), size=len1))
+        target = ''.join(rng.choice(list('iabcdefghjk'), size=len2))
+        pairs.append((source, target))
+    return pairs
+
+
+class TestMetrics:
+
+    def test_lev_np(self, label_strings):
+        for source, target in label_strings:
+            assert hvc.metrics.lev_np(source, target) == lev_full_matrix(source,
+                                                                         target)
+
+    def test_lev_np_without_rapidfuzz(self, label_strings, monkeypatch):
+        # uses numba if it's installed
+        monkeypatch.setattr(hvc.metrics, '_Levenshtein', None)
+        monkeypatch.setattr(hvc.metrics, '_lev', None)
+        for source, target in label_strings:
+            assert hvc.metrics.lev_np(source, target) == lev_full_matrix(source,
+                                                                         target)
+
+    def test_lev_np_cython(self, label_strings, monkeypatch):
+        # only if hvc was built with optional Cython extension
+        pytest.importorskip('hvc._lev')
+        monkeypatch.setattr(hvc.metrics, '_Levenshtein', None)
+        for source, target in label_strings:
+            assert hvc.metrics.lev_np(source, target) == lev_full_matrix(source,
+                                                                         target)
+        assert hvc.metrics.lev_np('i' * 100, 'a' * 64) == 100
+        assert hvc.metrics.lev_np(['i', 'ab'], ['ab', 'i']) == 2
+
+    def test_lev_np_without_numba(self, label_strings, monkeypatch):
+        # uses Myers' algorithm computed with Python integers
+        monkeypatch.setattr(hvc.metrics, '_Levenshtein', None)
+        monkeypatch.setattr(hvc.metrics, '_lev', None)
+        monkeypatch.setattr(hvc.metrics, '_lev_codes_jit', False)
+        for source, target in label_strings:
+            assert hvc.metrics.lev_np(source, target) == lev_full_matrix(source,
+                                                                         target)
+
+    def test_lev_myers(self, label_strings):
+        for source, target in label_strings:
+            if len(target) > 0:
+                assert hvc.metrics._lev_myers(source, target) == lev_full_matrix(source,
+                                                                                 target)
+        assert hvc.metrics._lev_myers('i' * 100, 'a' * 64) == 100
+        assert hvc.metrics._lev_myers('ia' * 100, 'ai' * 90) == 20
+        assert hvc.metrics._lev_myers(['i', 'ab'], ['ab', 'i']) == 2
+
+    def test_frame_error(self):
+        y_true = np.array([0, 0, 1, 1, 2, 2, 2, 0])
+        y_pred = np.array([0, 1, 1, 1, 2, 0, 2, 0])
+        assert hvc.metrics.frame_error(y_true, y_pred) == 0.25
+        assert hvc.metrics.frame_error(y_true, y_true) == 0.0
+        with pytest.raises(ValueError):
+            hvc.metrics.frame_error(y_true, y_pred[:-1])
+
+    def test_average_accuracy(self):
+        true_labels = np.array(list('iiiaabbbbc'))
+        pred_labels = np.array(list('iiaaabbbcc'))
+        # 'd' not in labels, so accuracy should be zero
+        acc_by_label, avg_acc = hvc.metrics.average_accuracy(true_labels,
+                                                             pred_labels,
+                                                             list('abcdi'))
+        assert np.allclose(acc_by_label, [1., 0.75, 1., 0., 2 / 3])
+        assert np.isclose(avg_acc, np.mean([1., 0.75, 1., 0., 2 / 3]))
+
+        # labels that aren't in labelset are ignored
+        acc_by_label, avg_acc = hvc.metrics.average_accuracy(true_labels,
+                                                             pred_labels,
+                                                             list('ab'))
+        assert np.allclose(acc_by_label, [1., 0.75])
+
+        # str labelset is a sequence of single-character labels
+        acc_by_label, avg_acc = hvc.metrics.average_accuracy(true_labels,
+                                                             pred_labels,
+                                                             'abci')
+        assert np.allclose(acc_by_label, [1., 0.75, 1., 2 / 3])
+
+        # lists work too
+        acc_by_label, avg_acc = hvc.metrics.average_accuracy(list(true_labels),
+                                                             list(pred_labels),
+                                                             list('ab'))
+        assert np.allclose(acc_by_label, [1., 0.75])
+
+        with pytest.raises(ValueError):
+            hvc.metrics.average_accuracy(true_labels, pred_labels[:-1], list('ab'))
+
+    def test_average_accuracy_codes(self):
+        labelset = 'abcdi'
+        true_codes = hvc.labels.labels_to_codes('iiiaabbbbc', labelset)
+        pred_codes = hvc.labels.labels_to_codes('iiaaabbbcc', labelset)
+        acc_by_label, avg_acc = hvc.metrics.average_accuracy_codes(true_codes,
+                                                                   pred_codes,
+                                                                   len(labelset))
+        assert np.allclose(acc_by_label, [1., 0.75, 1., 0., 2 / 3])
+        assert np.isclose(avg_acc, np.mean([1., 0.75, 1., 0., 2 / 3]))
+        # same as string API
+        assert np.allclose(acc_by_label,
+                           hvc.metrics.average_accuracy(list('iiiaabbbbc'),
+                                                        list('iiaaabbbcc'),
+                                                        list(labelset))[0])
+        with pytest.raises(ValueError):
+            hvc.metrics.average_accuracy_codes(true_codes, pred_codes[:-1],
+                                               len(labelset))
+
+    def test_lev_np_batch(self, label_strings, monkeypatch):
+        sources = [source for source, _ in label_strings]
+        targets = [target for _, target in label_strings]
+        expected = [lev_full_matrix(source, target)
+                    for source, target in label_strings]
+        assert np.array_equal(hvc.metrics.lev_np_batch(sources, targets),
+                              expected)
+        # with threads (if numba is installed) or without any
+        monkeypatch.setattr(hvc.metrics, '_Levenshtein', None)
+        monkeypatch.setattr(hvc.metrics, '_lev', None)
+        assert np.array_equal(hvc.metrics.lev_np_batch(sources, targets),
+                              expected)
+        monkeypatch.setattr(hvc.metrics, '_lev_codes_jit', False)
+        assert np.array_equal(hvc.metrics.lev_np_batch(sources, targets),
+                              expected)
+        with pytest.raises(ValueError):
+            hvc.metrics.lev_np_batch(sources, targets[:-1])
+
+    def test_lev_np_max_d(self, label_strings):
+        for max_d in (0, 1, 5, 20):
+            for source, target in label_strings:
+                dist = lev_full_matrix(source, target)
+                assert hvc.metrics.lev_np(source, target,
+                                          max_d=max_d) == min(dist, max_d + 1)
+
+    def test_hamming_dist(self):
+        y_true = np.array(list('iiaabbcc'))
+        y_pred = np.array(list('iiabbbca'))
+        assert hvc.metrics.hamming_dist(y_true, y_pred) == 0.25
+        assert hvc.metrics.hamming_dist(y_true, y_true) == 0.0
+        with pytest.raises(ValueError):
+            hvc.metrics.hamming_dist(y_true, y_pred[:-1])